@@ -2,9 +2,11 @@ from typing import Callable, Awaitable
 
 import uvicorn
 from fastapi import FastAPI, Request, Response
-from contextlib import asynccontextmanager
-from src.api import trading_results_api
-from src.services.cache_service import init_redis
+from contextlib import asynccontextmanager, suppress
+from src.api import trading_results_api, cache_api, batch_api
+from src.configs.config import config
+from src.databases.database import engine, read_router
+from src.services.cache_service import init_redis, close_redis
 import asyncio
 
 import logging
@@ -12,20 +14,31 @@ import logging
 log = logging.getLogger()
 
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     # Инициализация Redis
-#     redis = await init_redis()
-#     app.state.redis = redis
-#
-#     yield
-#     # Закрытие соединения при завершении
-#     await redis.close()
-
-
-app = FastAPI()
-# app = FastAPI(lifespan=lifespan)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Инициализация общего пула соединений Redis
+    app.state.redis = init_redis()
+    # Фоновая проверка реплик для чтения (если они настроены)
+    replica_checks = None
+    if read_router.replicas:
+        replica_checks = asyncio.create_task(read_router.run_checks(config.db.DB_REPLICA_CHECK_INTERVAL))
+
+    yield
+    # Закрытие пула при завершении
+    await close_redis(app.state.redis)
+    if replica_checks is not None:
+        replica_checks.cancel()
+        # Дожидаемся отмены, чтобы проверка не шла по уже закрытым пулам реплик
+        with suppress(asyncio.CancelledError):
+            await replica_checks
+    await read_router.dispose()
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(trading_results_api.router)
+app.include_router(cache_api.router)
+app.include_router(batch_api.router)
 
 
 # @app.middleware("http")
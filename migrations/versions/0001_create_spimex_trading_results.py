@@ -0,0 +1,45 @@
+"""create spimex_trading_results
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+Исходная схема. Если таблица уже создана раньше (до миграций),
+отметьте ревизию как примененную: alembic stamp 0001
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spimex_trading_results',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('exchange_product_id', sa.String(20), nullable=False),
+        sa.Column('exchange_product_name', sa.String(255)),
+        sa.Column('oil_id', sa.String(10)),
+        sa.Column('delivery_basis_id', sa.String(10)),
+        sa.Column('delivery_basis_name', sa.String(255)),
+        sa.Column('delivery_type_id', sa.String(1)),
+        sa.Column('volume', sa.Numeric(20, 2)),
+        sa.Column('total', sa.Numeric(20, 2)),
+        sa.Column('count', sa.Integer()),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('created_on', sa.DateTime()),
+        sa.Column('updated_on', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spimex_trading_results')
@@ -0,0 +1,70 @@
+"""indexes and unique (exchange_product_id, date) for spimex_trading_results
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+Индексы под запросы API:
+- date - /last_trading_dates (DISTINCT date ORDER BY date DESC) и /dynamics только по датам;
+- (oil_id | delivery_basis_id | delivery_type_id, date) - фильтр по измерению + диапазон дат
+  с сортировкой по дате; остальные измерения в INCLUDE, чтобы дополнительные фильтры
+  проверялись по индексу, не читая таблицу.
+Индексы строятся CONCURRENTLY, чтобы не блокировать запись парсера.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'spimex_trading_results'
+UNIQUE_NAME = 'uq_spimex_trading_results_product_date'
+
+INDEXES = [
+    ('ix_spimex_trading_results_date', ['date'], []),
+    ('ix_spimex_trading_results_oil_id_date', ['oil_id', 'date'], ['delivery_basis_id', 'delivery_type_id']),
+    ('ix_spimex_trading_results_delivery_basis_id_date', ['delivery_basis_id', 'date'],
+     ['oil_id', 'delivery_type_id']),
+    ('ix_spimex_trading_results_delivery_type_id_date', ['delivery_type_id', 'date'],
+     ['oil_id', 'delivery_basis_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Перед уникальным ограничением убираем дубликаты, оставляя последнюю запись
+    op.execute(f"""
+        DELETE FROM {TABLE} t
+        USING {TABLE} newer
+        WHERE t.exchange_product_id = newer.exchange_product_id
+          AND t.date = newer.date
+          AND t.id < newer.id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            UNIQUE_NAME, TABLE, ['exchange_product_id', 'date'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+        for name, columns, include in INDEXES:
+            op.create_index(
+                name, TABLE, columns,
+                postgresql_include=include, postgresql_concurrently=True, if_not_exists=True,
+            )
+
+    # Уникальный индекс становится ограничением (нужно для ON CONFLICT по этим полям)
+    op.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {UNIQUE_NAME} UNIQUE USING INDEX {UNIQUE_NAME}")
+    op.execute(f"ANALYZE {TABLE}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(UNIQUE_NAME, TABLE, type_='unique')
+    with op.get_context().autocommit_block():
+        for name, _, _ in INDEXES:
+            op.drop_index(name, table_name=TABLE, postgresql_concurrently=True, if_exists=True)
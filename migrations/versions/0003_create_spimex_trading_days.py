@@ -0,0 +1,46 @@
+"""create spimex_trading_days
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:20:00
+
+Справочник торговых дней (дата, число строк, суммарный объем, время загрузки).
+Его обновляет парсер при сохранении бюллетеня, а /last_trading_dates читает
+по первичному ключу вместо DISTINCT по всей таблице результатов.
+Существующие дни заполняются из spimex_trading_results.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spimex_trading_days',
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('rows_count', sa.Integer(), nullable=False),
+        sa.Column('total_volume', sa.Numeric(20, 2), nullable=False),
+        sa.Column('ingested_at', sa.DateTime(), nullable=False),
+    )
+    op.execute(
+        """
+        INSERT INTO spimex_trading_days (date, rows_count, total_volume, ingested_at)
+        SELECT date, count(*), coalesce(sum(volume), 0), max(coalesce(updated_on, created_on, now()))
+        FROM spimex_trading_results
+        GROUP BY date
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spimex_trading_days')
@@ -0,0 +1,66 @@
+"""create spimex_daily_rollups and spimex_monthly_rollups
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:30:00
+
+Витрины для /aggregates: суммы объема, оборота и числа сделок по дню (месяцу)
+и измерениям продукта. Парсер пересчитывает их за даты каждого бюллетеня;
+здесь они заполняются по уже загруженной истории.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['spimex_daily_rollups', 'spimex_monthly_rollups']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.create_table(
+            table,
+            sa.Column('date', sa.Date(), primary_key=True),
+            sa.Column('oil_id', sa.String(10), primary_key=True),
+            sa.Column('delivery_basis_id', sa.String(10), primary_key=True),
+            sa.Column('delivery_type_id', sa.String(1), primary_key=True),
+            sa.Column('volume', sa.Numeric(20, 2), nullable=False),
+            sa.Column('total', sa.Numeric(20, 2), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+        )
+
+    op.execute(
+        """
+        INSERT INTO spimex_daily_rollups
+            (date, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT date, oil_id, delivery_basis_id, delivery_type_id,
+               coalesce(sum(volume), 0), coalesce(sum(total), 0), coalesce(sum(count), 0)
+        FROM spimex_trading_results
+        WHERE oil_id IS NOT NULL AND delivery_basis_id IS NOT NULL AND delivery_type_id IS NOT NULL
+        GROUP BY date, oil_id, delivery_basis_id, delivery_type_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO spimex_monthly_rollups
+            (date, oil_id, delivery_basis_id, delivery_type_id, volume, total, count)
+        SELECT CAST(date_trunc('month', date) AS DATE), oil_id, delivery_basis_id, delivery_type_id,
+               sum(volume), sum(total), sum(count)
+        FROM spimex_daily_rollups
+        GROUP BY CAST(date_trunc('month', date) AS DATE), oil_id, delivery_basis_id, delivery_type_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_table(table)
@@ -0,0 +1,34 @@
+"""add source_url and content_hash to spimex_trading_days
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:10:00
+
+Справочник торговых дней становится журналом загрузок: адрес файла бюллетеня
+и его SHA-256. Инкрементальный запуск парсера прекращает обход списка
+бюллетеней на уже загруженных датах и не разбирает файлы, которые не изменились.
+У загруженных ранее дней хеша нет - такие бюллетени разбираются, как раньше.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('spimex_trading_days', sa.Column('source_url', sa.String(512), nullable=True))
+    op.add_column('spimex_trading_days', sa.Column('content_hash', sa.String(64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('spimex_trading_days', 'content_hash')
+    op.drop_column('spimex_trading_days', 'source_url')
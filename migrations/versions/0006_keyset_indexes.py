@@ -0,0 +1,60 @@
+"""append id to spimex_trading_results indexes for keyset pagination
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 14:00:00
+
+Страницы /dynamics и /trading_results сортируются по (date DESC, id DESC).
+Индексы из 0002 заканчиваются на date, поэтому PostgreSQL досортировывал
+каждую страницу (Sort / Incremental Sort) поверх сканирования индекса.
+Новые индексы заканчиваются на (date, id) и отдают строки уже в нужном порядке.
+Новые строятся CONCURRENTLY до удаления старых, чтобы запросы не остались без индекса.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'spimex_trading_results'
+
+# (старое имя, новое имя, колонки нового индекса, INCLUDE)
+INDEXES = [
+    ('ix_spimex_trading_results_date', 'ix_spimex_trading_results_date_id', ['date', 'id'], []),
+    ('ix_spimex_trading_results_oil_id_date', 'ix_spimex_trading_results_oil_id_date_id',
+     ['oil_id', 'date', 'id'], ['delivery_basis_id', 'delivery_type_id']),
+    ('ix_spimex_trading_results_delivery_basis_id_date', 'ix_spimex_trading_results_delivery_basis_id_date_id',
+     ['delivery_basis_id', 'date', 'id'], ['oil_id', 'delivery_type_id']),
+    ('ix_spimex_trading_results_delivery_type_id_date', 'ix_spimex_trading_results_delivery_type_id_date_id',
+     ['delivery_type_id', 'date', 'id'], ['oil_id', 'delivery_basis_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for _, name, columns, include in INDEXES:
+            op.create_index(
+                name, TABLE, columns,
+                postgresql_include=include, postgresql_concurrently=True, if_not_exists=True,
+            )
+        for old_name, _, _, _ in INDEXES:
+            op.drop_index(old_name, table_name=TABLE, postgresql_concurrently=True, if_exists=True)
+    op.execute(f"ANALYZE {TABLE}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for old_name, _, columns, include in INDEXES:
+            op.create_index(
+                old_name, TABLE, columns[:-1],
+                postgresql_include=include, postgresql_concurrently=True, if_not_exists=True,
+            )
+        for _, name, _, _ in INDEXES:
+            op.drop_index(name, table_name=TABLE, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,38 @@
+"""create spimex_pending_bulletins
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:00:00
+
+Бюллетени, которые парсер нашел в списке, но еще не загрузил. Парсер пишет их
+перед загрузкой и удаляет после, поэтому бюллетень, упавший при скачивании,
+разборе или записи (или прерванный запуск), остается в таблице. Инкрементальный
+запуск обходит список бюллетеней до самой старой такой даты и загружает ее снова.
+Пропуски, оставшиеся от запусков до этой миграции, закрывает один запуск с --full.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'spimex_pending_bulletins',
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('url', sa.String(512), nullable=False),
+        sa.Column('listed_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spimex_pending_bulletins')
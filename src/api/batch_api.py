@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, Optional
+from urllib.parse import urlencode
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import ValidationError
+
+from src.api.trading_results_api import get_dynamics, get_trading_results
+from src.configs.config import config
+from src.schemas.batch_schema import BatchRequest, DynamicsParams, TradingResultsParams
+from src.services.cache_metrics import cache_metrics
+from src.services.cache_service import (
+    CacheEntry, CacheService, background_session, data_version, get_redis, query_signature,
+)
+
+router = APIRouter()
+
+# Эндпоинты, доступные в пакете: кешируемый обработчик и модель его параметров
+BATCH_ENDPOINTS = {
+    'dynamics': (get_dynamics, DynamicsParams),
+    'trading_results': (get_trading_results, TradingResultsParams),
+}
+
+
+def batch_query_signature(endpoint: str, params: dict[str, Any]) -> str:
+    """
+    Адрес отдельного GET-запроса, равного запросу из пакета, - под ним запрос учитывается
+    в статистике прогрева (сам /batch прогреть нельзя). Параметры по умолчанию опускаются.
+    """
+    signature = f"/{endpoint}"
+    if params:
+        signature += f"?{urlencode(sorted(params.items()))}"
+    return signature
+
+
+def batch_item(entry: CacheEntry) -> dict[str, Any]:
+    """Результат одного запроса: тело из кеша вставляется в ответ как есть, без разбора"""
+    return {'status': 200, 'headers': entry.headers or {}, 'data': orjson.Fragment(entry.body)}
+
+
+@router.post("/batch")
+async def batch(request: Request, body: BatchRequest) -> Response:
+    """
+    Несколько запросов /dynamics и /trading_results за один вызов (панели дашборда).
+    Попадания в кеш читаются одним MGET, промахи считаются параллельно
+    (не больше BATCH_CONCURRENCY сразу) и кладутся в те же ключи, что и у отдельных
+    запросов. Ответ - {id: {status, headers, data | detail}} в порядке запросов.
+    """
+    redis = get_redis(request)
+    # Свои метрики у пакета - только задержка MGET; попадания и промахи считаются по эндпоинтам панелей
+    cache = CacheService(redis, metrics=cache_metrics.get("spimex", "batch"))
+    version = await data_version.get(redis)
+
+    # Запросы прогрева не учитываются в статистике, как и у отдельных эндпоинтов
+    record = query_signature(request) is not None
+    results: dict[str, Any] = {}
+    pending = []
+    for query in body.queries:
+        handler, params_model = BATCH_ENDPOINTS[query.endpoint]
+        endpoint = handler.cached
+        try:
+            model = params_model.model_validate(query.params)
+            params = model.model_dump()
+            # Ключ строится через key_params эндпоинта - там же проверяются даты
+            cache_key = endpoint.cache_key(version, params)
+        except ValidationError as e:
+            results[query.id] = {'status': 422, 'detail': e.errors(include_url=False, include_context=False)}
+            continue
+        except HTTPException as e:
+            results[query.id] = {'status': e.status_code, 'detail': e.detail}
+            continue
+        signature = batch_query_signature(query.endpoint, model.model_dump(exclude_defaults=True)) if record else None
+        pending.append((query.id, endpoint, params, cache_key, signature))
+
+    entries = await cache.get_many(
+        [cache_key for _, _, _, cache_key, _ in pending],
+        metrics=[endpoint.cache_for(request).metrics for _, endpoint, _, _, _ in pending],
+    )
+    semaphore = asyncio.Semaphore(config.api.BATCH_CONCURRENCY)
+
+    async def load(query_id, endpoint, params, cache_key, signature: Optional[str]):
+        async with semaphore:
+            try:
+                # У каждого пересчета своя сессия: одну сессию нельзя использовать параллельно
+                async with background_session(request) as session:
+                    entry = await endpoint.load(
+                        request, endpoint.cache_for(request), cache_key, {**params, 'session': session}
+                    )
+            except HTTPException as e:
+                return query_id, {'status': e.status_code, 'detail': e.detail}
+        if signature:
+            await cache.record_query(signature)
+        return query_id, batch_item(entry)
+
+    misses = []
+    for (query_id, endpoint, params, cache_key, signature), entry in zip(pending, entries):
+        if entry is None:
+            misses.append(load(query_id, endpoint, params, cache_key, signature))
+            continue
+        if signature:
+            cache.record_hit(signature)
+        # session=None: фоновое обновление устаревшего значения откроет свою сессию
+        endpoint.serve(request, endpoint.cache_for(request), cache_key, entry, {**params, 'session': None})
+        results[query_id] = batch_item(entry)
+
+    for query_id, result in await asyncio.gather(*misses):
+        results[query_id] = result
+
+    ordered = {query.id: results[query.id] for query in body.queries}
+    return Response(content=orjson.dumps(ordered), media_type="application/json")
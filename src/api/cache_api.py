@@ -0,0 +1,41 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from src.configs.config import config
+from src.services.cache_metrics import cache_metrics
+from src.services.cache_service import local_cache, compression_stats
+
+
+def require_admin_token(authorization: Optional[str] = Header(None)) -> None:
+    """
+    Служебные эндпоинты доступны только с заголовком Authorization: Bearer <CACHE_ADMIN_TOKEN>.
+    Без настроенного токена их как будто нет (404): статистика раскрывает ключи и нагрузку.
+    """
+    token = config.api.CACHE_ADMIN_TOKEN
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/cache", tags=["cache"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/stats", include_in_schema=False)
+async def get_cache_stats():
+    """Служебная статистика кеша текущего воркера"""
+    return {
+        "local": local_cache.stats(),
+        "compression": compression_stats.stats(),
+        "endpoints": cache_metrics.stats(),
+    }
+
+
+@router.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def get_cache_metrics():
+    """Метрики кеша текущего воркера в формате Prometheus"""
+    return PlainTextResponse(cache_metrics.prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,22 +1,28 @@
 from datetime import date, timedelta
-from typing import Annotated, Optional, List
+from typing import Annotated, Optional, List, Tuple, Literal
 from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, desc
 
-from src.databases.database import get_session, base_query
-from src.models.trading_results_model import SpimexTradingResults
-from src.schemas.trading_result_schema import TradingResult
-from src.services.cache_service import cache_response, get_seconds_until_tomorrow_1411
+from src.configs.config import config
+from src.databases.database import get_read_session, fetch_results, build_query, RESULT_COLUMNS
+from src.databases.aggregates import fetch_aggregates, aggregate_from_row, rollup_source, DIMENSIONS
+from src.models.trading_results_model import SpimexTradingResults, SpimexTradingDays
+from src.schemas.trading_result_schema import TradingResult, trading_result_from_row
+from src.schemas.trading_day_schema import TradingDay
+from src.schemas.trading_aggregate_schema import TradingAggregate
+from src.services.cache_service import cache_response, CachedResponse
+from src.services.pagination import KEYSET_ORDER, keyset_filter, split_page
+from src.services.streaming import streaming_response
 
 router = APIRouter()
 
 
 @router.get("/last_trading_dates", response_model=List[date])
-@cache_response(key_prefix="spimex", expire=get_seconds_until_tomorrow_1411())
+@cache_response(key_prefix="spimex")
 async def get_last_trading_dates(
         request: Request,
-        session: Annotated[AsyncSession, Depends(get_session)],
+        session: Annotated[AsyncSession, Depends(get_read_session)],
         limit: int = Query(
             default=5,
             ge=1,
@@ -24,10 +30,10 @@ async def get_last_trading_dates(
             description="Количество последних торговых дней (1-1000)"
         )
 ):
+    # Справочник торговых дней: чтение по первичному ключу, не зависит от объема истории
     stmt = (
-        select(SpimexTradingResults.date)
-        .distinct()
-        .order_by(SpimexTradingResults.date.desc())
+        select(SpimexTradingDays.date)
+        .order_by(SpimexTradingDays.date.desc())
         .limit(limit)
     )
     results = await session.scalars(stmt)
@@ -35,6 +41,29 @@ async def get_last_trading_dates(
     dates = [str(row) for row in results]
     return dates
 
+
+@router.get("/trading_days", response_model=List[TradingDay])
+@cache_response(key_prefix="spimex")
+async def get_trading_days(
+        request: Request,
+        session: Annotated[AsyncSession, Depends(get_read_session)],
+        limit: int = Query(
+            default=5,
+            ge=1,
+            le=1000,
+            description="Количество последних торговых дней (1-1000)"
+        )
+) -> List[TradingDay]:
+    """Последние торговые дни с числом строк, объемом торгов и временем загрузки"""
+    stmt = (
+        select(SpimexTradingDays)
+        .order_by(SpimexTradingDays.date.desc())
+        .limit(limit)
+    )
+    results = await session.scalars(stmt)
+
+    return [TradingDay.model_validate(row) for row in results]
+
 def validate_date(date_str: Optional[str]) -> Optional[date]:
     if not date_str:
         return None
@@ -47,16 +76,78 @@ def validate_date(date_str: Optional[str]) -> Optional[date]:
         )
 
 
+def resolve_date_range(
+        start_date: Optional[str],
+        end_date: Optional[str]
+) -> Tuple[Optional[date], Optional[date]]:
+    """Валидирует даты и подставляет значения по умолчанию"""
+    start_date_obj = validate_date(start_date) if start_date else None
+    end_date_obj = validate_date(end_date) if end_date else None
+
+    # Установка дефолтных дат если нужно
+    if start_date_obj and not end_date_obj:
+        end_date_obj = date.today()
+    elif end_date_obj and not start_date_obj:
+        start_date_obj = end_date_obj - timedelta(days=365)
+
+    return start_date_obj, end_date_obj
+
+
+def dynamics_cache_params(params: dict) -> dict:
+    """Параметры /dynamics для ключа кеша: с уже подставленными датами"""
+    start_date_obj, end_date_obj = resolve_date_range(params.get('start_date'), params.get('end_date'))
+    return {**params, 'start_date': start_date_obj, 'end_date': end_date_obj}
+
+
+def result_filters(
+        oil_id: Optional[str],
+        delivery_type_id: Optional[str],
+        delivery_basis_id: Optional[str],
+        start_date_obj: Optional[date] = None,
+        end_date_obj: Optional[date] = None,
+        model=SpimexTradingResults,
+) -> list:
+    """Фильтры по измерениям и диапазону дат для запросов к результатам торгов (или витринам)"""
+    filters = []
+    if start_date_obj:
+        filters.append(model.date >= start_date_obj)
+    if end_date_obj:
+        filters.append(model.date <= end_date_obj)
+    if oil_id:
+        filters.append(model.oil_id == oil_id)
+    if delivery_type_id:
+        filters.append(model.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        filters.append(model.delivery_basis_id == delivery_basis_id)
+    return filters
+
+
+def is_stream_request(params: dict) -> bool:
+    """Потоковая выгрузка идет мимо кеша"""
+    return params.get('format', 'json') != 'json'
+
+
 @router.get("/dynamics", response_model=List[TradingResult])
-@cache_response(key_prefix="spimex", expire=get_seconds_until_tomorrow_1411())
+@cache_response(key_prefix="spimex", key_params=dynamics_cache_params, bypass=is_stream_request)
 async def get_dynamics(
         request: Request,
-        session: Annotated[AsyncSession, Depends(get_session)],
+        session: Annotated[AsyncSession, Depends(get_read_session)],
         oil_id: Optional[str] = Query(None),
         delivery_type_id: Optional[str] = Query(None),
         delivery_basis_id: Optional[str] = Query(None),
         start_date: Optional[str] = Query(None),  # Изменено на str для валидации
-        end_date: Optional[str] = Query(None)     # Изменено на str для валидации
+        end_date: Optional[str] = Query(None),    # Изменено на str для валидации
+        limit: int = Query(
+            default=config.api.DEFAULT_PAGE_SIZE,
+            ge=1,
+            le=config.api.MAX_PAGE_SIZE,
+            description="Размер страницы"
+        ),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        format: Literal['json', 'ndjson', 'csv'] = Query(
+            default='json',
+            description="json - страница; ndjson/csv - потоковая выгрузка всех строк без лимита"
+        )
 ) -> List[TradingResult]:
     # Проверка, что указан хотя бы один фильтр
     if not any([oil_id, delivery_type_id, delivery_basis_id, start_date, end_date]):
@@ -65,15 +156,8 @@ async def get_dynamics(
             detail="Необходимо указать хотя бы один фильтр (oil_id, delivery_type_id, delivery_basis_id или даты)"
         )
 
-    # Валидация дат
-    start_date_obj = validate_date(start_date) if start_date else None
-    end_date_obj = validate_date(end_date) if end_date else None
-
-    # Установка дефолтных дат если нужно
-    if start_date_obj and not end_date_obj:
-        end_date_obj = date.today()
-    elif end_date_obj and not start_date_obj:
-        start_date_obj = end_date_obj - timedelta(days=365)
+    # Валидация дат и установка дефолтных значений
+    start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
 
     # Проверка что start_date <= end_date
     if start_date_obj and end_date_obj and start_date_obj > end_date_obj:
@@ -83,25 +167,24 @@ async def get_dynamics(
         )
 
     # Сбор фильтров
-    filters = []
-    if start_date_obj:
-        filters.append(SpimexTradingResults.date >= start_date_obj)
-    if end_date_obj:
-        filters.append(SpimexTradingResults.date <= end_date_obj)
-    if oil_id:
-        filters.append(SpimexTradingResults.oil_id == oil_id)
-    if delivery_type_id:
-        filters.append(SpimexTradingResults.delivery_type_id == delivery_type_id)
-    if delivery_basis_id:
-        filters.append(SpimexTradingResults.delivery_basis_id == delivery_basis_id)
+    filters = result_filters(oil_id, delivery_type_id, delivery_basis_id, start_date_obj, end_date_obj)
+    filters.extend(keyset_filter(cursor))
 
-    results = await base_query(
+    if format != 'json':
+        # Строки читаются серверным курсором и пишутся в ответ по мере получения
+        stmt = build_query(filters=filters if filters else None, order_by=KEYSET_ORDER, columns=RESULT_COLUMNS)
+        return streaming_response(request, stmt, format, filename="dynamics")
+
+    # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+    results = await fetch_results(
         session,
         filters=filters if filters else None,
-        order_by=desc(SpimexTradingResults.date)
+        order_by=KEYSET_ORDER,
+        limit=limit + 1
     )
+    results, headers = split_page(results, limit)
     if len(results) > 0:
-        return [TradingResult.model_validate(row) for row in results]
+        return CachedResponse([trading_result_from_row(row) for row in results], headers)
     else:
         raise HTTPException(
             status_code=200,
@@ -110,14 +193,15 @@ async def get_dynamics(
 
 
 @router.get("/trading_results", response_model=List[TradingResult])
-@cache_response(key_prefix="spimex", expire=get_seconds_until_tomorrow_1411())
+@cache_response(key_prefix="spimex")
 async def get_trading_results(
         request: Request,
-        session: Annotated[AsyncSession, Depends(get_session)],
+        session: Annotated[AsyncSession, Depends(get_read_session)],
         oil_id: Optional[str] = Query(None),
         delivery_type_id: Optional[str] = Query(None),
         delivery_basis_id: Optional[str] = Query(None),
-        limit: int = Query(default=10, ge=1)
+        limit: int = Query(default=10, ge=1, le=config.api.MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor")
 ) -> List[TradingResult]:
     # Проверка, что указан хотя бы один фильтр
     if not any([oil_id, delivery_type_id, delivery_basis_id]):
@@ -126,19 +210,62 @@ async def get_trading_results(
             detail="Необходимо указать хотя бы один фильтр (oil_id, delivery_type_id, delivery_basis_id)"
         )
 
-    filters = []
-    if oil_id:
-        filters.append(SpimexTradingResults.oil_id == oil_id)
-    if delivery_type_id:
-        filters.append(SpimexTradingResults.delivery_type_id == delivery_type_id)
-    if delivery_basis_id:
-        filters.append(SpimexTradingResults.delivery_basis_id == delivery_basis_id)
+    filters = result_filters(oil_id, delivery_type_id, delivery_basis_id)
+    filters.extend(keyset_filter(cursor))
+
+    results = await fetch_results(
+        session,
+        filters=filters if filters else None,
+        order_by=KEYSET_ORDER,
+        limit=limit + 1
+    )
+    results, headers = split_page(results, limit)
+
+    return CachedResponse([trading_result_from_row(row) for row in results], headers)
+
+
+def aggregates_cache_params(params: dict) -> dict:
+    """Параметры /aggregates для ключа кеша: даты подставлены, измерения без повторов и по порядку"""
+    group_by = [name for name in DIMENSIONS if name in (params.get('group_by') or [])]
+    return {**dynamics_cache_params(params), 'group_by': group_by}
+
+
+@router.get("/aggregates", response_model=List[TradingAggregate])
+@cache_response(key_prefix="spimex", key_params=aggregates_cache_params)
+async def get_aggregates(
+        request: Request,
+        session: Annotated[AsyncSession, Depends(get_read_session)],
+        period: Literal['day', 'week', 'month'] = Query(default='day', description="Период группировки"),
+        group_by: List[Literal['oil_id', 'delivery_basis_id', 'delivery_type_id']] = Query(
+            default=[],
+            description="Измерения для группировки (можно несколько)"
+        ),
+        oil_id: Optional[str] = Query(None),
+        delivery_type_id: Optional[str] = Query(None),
+        delivery_basis_id: Optional[str] = Query(None),
+        start_date: Optional[str] = Query(None),
+        end_date: Optional[str] = Query(None)
+) -> List[TradingAggregate]:
+    """
+    Объем, оборот, число сделок и средневзвешенная цена (VWAP) по периодам
+    и выбранным измерениям - одна агрегированная строка вместо тысяч строк /dynamics.
+    Считается по витринам, которые ведет парсер, а не по таблице результатов.
+    """
+    start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
+    if start_date_obj and end_date_obj and start_date_obj > end_date_obj:
+        raise HTTPException(
+            status_code=400,
+            detail="Дата начала должна быть раньше даты окончания"
+        )
 
-    results = await base_query(
+    model = rollup_source(period, start_date_obj, end_date_obj)
+    filters = result_filters(oil_id, delivery_type_id, delivery_basis_id, start_date_obj, end_date_obj, model)
+    results = await fetch_aggregates(
         session,
+        period=period,
+        group_by=[name for name in DIMENSIONS if name in group_by],
         filters=filters if filters else None,
-        order_by=desc(SpimexTradingResults.date),
-        limit=limit
+        model=model,
     )
 
-    return [TradingResult.model_validate(row) for row in results]
+    return [aggregate_from_row(row) for row in results]
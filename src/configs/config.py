@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
@@ -9,11 +11,24 @@ class DatabaseConfig(BaseSettings):
     DB_USER: str
     DB_PASSWORD: str
     DB_DATABASE: str
+    DB_POOL_SIZE: int = 30  # Размер пула основной БД
+    DB_MAX_OVERFLOW: int = 20  # Сколько соединений сверх пула основной БД
+    DB_POOL_RECYCLE: int = 3600  # Через сколько секунд пересоздавать соединение
+    DB_REPLICA_URLS: str = ""  # URL реплик для чтения через запятую, пусто - читаем из основной БД
+    DB_REPLICA_POOL_SIZE: int = 30  # Размер пула каждой реплики
+    DB_REPLICA_MAX_OVERFLOW: int = 20  # Сколько соединений сверх пула каждой реплики
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0  # Как часто проверять реплики (сек)
+    DB_REPLICA_CHECK_TIMEOUT: float = 2.0  # Таймаут проверки реплики (сек)
+    DB_REPLICA_MAX_LAG: float = 30.0  # Реплика с отставанием больше этого исключается (сек)
 
     @property
     def DB_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_DATABASE}"
 
+    @property
+    def REPLICA_URLS(self) -> list[str]:
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(',') if url.strip()]
+
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -24,6 +39,21 @@ class RedisConfig(BaseSettings):
     REDIS_HOST: str
     REDIS_PORT: int
     CACHE_RESET_TIME: str
+    REDIS_MAX_CONNECTIONS: int = 50  # Максимальный размер пула соединений
+    REDIS_POOL_TIMEOUT: float = 5.0  # Сколько ждать свободное соединение из пула (сек)
+    REDIS_SOCKET_TIMEOUT: float = 2.0  # Таймаут операций чтения/записи (сек)
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0  # Таймаут установки соединения (сек)
+    LOCAL_CACHE_MAX_ITEMS: int = 256  # Сколько ключей держать в памяти процесса
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Лимит памяти локального кеша (байт)
+    CACHE_LOCK_TIMEOUT: float = 30.0  # Время жизни блокировки на пересчет ключа (сек)
+    CACHE_LOCK_WAIT: float = 5.0  # Сколько ждать результат чужого пересчета (сек)
+    CACHE_LOCK_POLL_INTERVAL: float = 0.05  # Как часто проверять, появился ли результат (сек)
+    CACHE_STALE_GRACE: float = 60.0  # Сколько можно отдавать устаревшее значение из памяти (сек)
+    CACHE_VERSION_REFRESH: float = 1.0  # Как часто перечитывать версию данных из Redis (сек)
+    CACHE_STALE_TTL: int = 3600  # Сколько отдавать устаревшее значение, обновляя его в фоне (сек)
+    CACHE_COMPRESSION_THRESHOLD: int = 4096  # Сжимать тела ответов от этого размера (байт), 0 - не сжимать
+    CACHE_COMPRESSION_LEVEL: int = 6  # Уровень сжатия zlib (1-9)
+    CACHE_HIT_SAMPLE_RATE: float = 0.1  # Доля попаданий в кеш, учитываемых в статистике прогрева (0 - только промахи)
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -32,7 +62,21 @@ class RedisConfig(BaseSettings):
 
     @property
     def REDIS_URL(self):
-        return f"redis://{config.redis.REDIS_HOST}:{config.redis.REDIS_PORT}"
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
+
+
+class ApiConfig(BaseSettings):
+    MAX_PAGE_SIZE: int = 1000  # Максимальный размер страницы /dynamics и /trading_results
+    DEFAULT_PAGE_SIZE: int = 100  # Размер страницы /dynamics по умолчанию
+    STREAM_BATCH_SIZE: int = 1000  # Сколько строк читать из курсора за раз при потоковой выгрузке
+    MAX_BATCH_SIZE: int = 50  # Сколько запросов можно передать в POST /batch
+    BATCH_CONCURRENCY: int = 8  # Сколько промахов кеша из /batch считать одновременно
+    CACHE_ADMIN_TOKEN: Optional[str] = None  # Токен /cache/stats и /cache/metrics; не задан - они отключены
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+    )
 
 
 class LoggingConfig(BaseSettings):
@@ -47,6 +91,7 @@ class LoggingConfig(BaseSettings):
 class Config(BaseSettings):
     db: DatabaseConfig = Field(default_factory=DatabaseConfig)
     redis: RedisConfig = Field(default_factory=RedisConfig)
+    api: ApiConfig = Field(default_factory=ApiConfig)
     log: LoggingConfig = Field(default_factory=LoggingConfig)
 
 
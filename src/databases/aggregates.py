@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import select, and_, cast, func, literal_column, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.trading_results_model import SpimexTradingResults, SpimexDailyRollups, SpimexMonthlyRollups
+
+PERIODS = ('day', 'week', 'month')
+DIMENSIONS = ('oil_id', 'delivery_basis_id', 'delivery_type_id')
+
+
+def period_start(period: str, column, dialect: str):
+    """
+    Начало периода (понедельник недели, первое число месяца), в который попадает дата.
+    Период подставляется литералом, чтобы выражения в SELECT и GROUP BY совпадали.
+    """
+    if period == 'day':
+        return column
+    if dialect == 'sqlite':
+        if period == 'week':
+            # Ближайшее воскресенье (или сама дата) минус 6 дней - понедельник недели
+            return func.date(column, literal_column("'weekday 0'"), literal_column("'-6 days'"), type_=Date)
+        return func.date(column, literal_column("'start of month'"), type_=Date)
+    return cast(func.date_trunc(literal_column(f"'{period}'"), column), Date)
+
+
+def rollup_source(period: str, start_date: Optional[date], end_date: Optional[date]):
+    """
+    Витрина, из которой считать агрегат. Месячная - только если диапазон дат
+    покрывает месяцы целиком (иначе в сумму попали бы дни вне диапазона),
+    в остальных случаях - дневная.
+    """
+    if period != 'month':
+        return SpimexDailyRollups
+    starts_on_month = start_date is None or start_date.day == 1
+    ends_on_month = end_date is None or end_date >= date.today() or (end_date + timedelta(days=1)).day == 1
+    return SpimexMonthlyRollups if starts_on_month and ends_on_month else SpimexDailyRollups
+
+
+async def fetch_aggregates(
+        session: AsyncSession,
+        period: str,
+        group_by: Sequence[str] = (),
+        filters=None,
+        model=SpimexTradingResults,
+):
+    """
+    Сумма объема, оборота и числа сделок и средневзвешенная по объему цена
+    (total / volume) по периодам и выбранным измерениям. Считается в БД через GROUP BY
+    по model: таблице результатов или витрине с теми же колонками.
+    """
+    start = period_start(period, model.date, session.get_bind().dialect.name).label('period_start')
+    dimensions = [getattr(model, name) for name in group_by]
+    volume = func.sum(model.volume)
+    total = func.sum(model.total)
+
+    stmt = (
+        select(
+            start,
+            *dimensions,
+            volume.label('volume'),
+            total.label('total'),
+            func.sum(model.count).label('count'),
+            (total / func.nullif(volume, 0)).label('vwap'),
+        )
+        .group_by(start, *dimensions)
+        .order_by(start.desc(), *dimensions)
+    )
+    if filters:
+        stmt = stmt.where(and_(*filters))
+
+    result = await session.execute(stmt)
+    return result.all()
+
+
+def aggregate_from_row(row: Any) -> dict[str, Any]:
+    """Строка агрегата -> ответ: Numeric -> float, дата -> ISO-строка"""
+    result = {}
+    for name, value in row._mapping.items():
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, date):
+            value = value.isoformat()
+        result[name] = value
+    return result
@@ -1,32 +1,136 @@
+from typing import Callable, Optional
+
+from asyncpg import PostgresError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import select, and_, desc
+from sqlalchemy.exc import OperationalError, InterfaceError
 
 from src.configs.config import config
+from src.databases.replicas import ReplicaRouter
 from src.models.trading_results_model import SpimexTradingResults
 
 DATABASE_URL = config.db.DB_URL
 
-engine = create_async_engine(DATABASE_URL, pool_size=30, max_overflow=20, pool_recycle=3600)
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=config.db.DB_POOL_SIZE,
+    max_overflow=config.db.DB_MAX_OVERFLOW,
+    pool_recycle=config.db.DB_POOL_RECYCLE,
+)
 
 new_session = async_sessionmaker(bind=engine, expire_on_commit=False)
 
+# Реплики только для чтения: свой пул у каждой, чтобы API не делил соединения с загрузкой данных
+read_router = ReplicaRouter(
+    engine,
+    [
+        create_async_engine(
+            url,
+            pool_size=config.db.DB_REPLICA_POOL_SIZE,
+            max_overflow=config.db.DB_REPLICA_MAX_OVERFLOW,
+            pool_recycle=config.db.DB_POOL_RECYCLE,
+        )
+        for url in config.db.REPLICA_URLS
+    ],
+    check_timeout=config.db.DB_REPLICA_CHECK_TIMEOUT,
+    max_lag=config.db.DB_REPLICA_MAX_LAG,
+)
+
 
 async def get_session():
     async with new_session() as session:
         yield session
 
 
-async def base_query(session: AsyncSession, filters=None, order_by=None, limit=None):
-    stmt = select(SpimexTradingResults)
+class LazySession:
+    """
+    Обертка над AsyncSession, которая создает сессию при первом обращении.
+    Эндпоинты с кешем получают ее через Depends, но при попадании в кеш
+    не трогают: ни сессия, ни выбор реплики, ни соединение из пула не нужны.
+    """
+
+    def __init__(self, factory: Callable[[], AsyncSession]):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+async def get_read_session():
+    """
+    Сессия для чтения: реплика по кругу, без живых реплик - основная БД.
+    Реплика выбирается и сессия открывается только при первом запросе к БД.
+    """
+    bind = None
+
+    def open_session() -> AsyncSession:
+        nonlocal bind
+        bind = read_router.pick()
+        return read_router.session(bind)
+
+    session = LazySession(open_session)
+    try:
+        yield session
+    except (OperationalError, InterfaceError, OSError, PostgresError):
+        # Ошибка соединения (asyncpg при подключении может поднять свою, не обернутую SQLAlchemy):
+        # исключаем реплику до следующей проверки
+        if bind is not None:
+            read_router.mark_down(bind)
+        raise
+    finally:
+        await session.close()
+
+
+# Колонки, которые отдает API (поля TradingResult), и id для курсора пагинации.
+# Без created_on/updated_on и без сборки ORM-объектов
+RESULT_COLUMNS = (
+    SpimexTradingResults.exchange_product_id,
+    SpimexTradingResults.exchange_product_name,
+    SpimexTradingResults.oil_id,
+    SpimexTradingResults.delivery_basis_id,
+    SpimexTradingResults.delivery_basis_name,
+    SpimexTradingResults.delivery_type_id,
+    SpimexTradingResults.volume,
+    SpimexTradingResults.total,
+    SpimexTradingResults.count,
+    SpimexTradingResults.date,
+    SpimexTradingResults.id,
+)
+
+
+def build_query(filters=None, order_by=None, limit=None, columns=None):
+    stmt = select(*columns) if columns else select(SpimexTradingResults)
 
     if filters:
         stmt = stmt.where(and_(*filters))
 
     if order_by is not None:
-        stmt = stmt.order_by(order_by)
+        # Можно передать одно выражение или несколько (например, для keyset-пагинации)
+        stmt = stmt.order_by(*order_by) if isinstance(order_by, (list, tuple)) else stmt.order_by(order_by)
 
     if limit is not None:
         stmt = stmt.limit(limit)
 
-    result = await session.execute(stmt)
+    return stmt
+
+
+async def base_query(session: AsyncSession, filters=None, order_by=None, limit=None):
+    result = await session.execute(build_query(filters, order_by, limit))
     return result.scalars().all()
+
+
+async def fetch_results(session: AsyncSession, filters=None, order_by=None, limit=None):
+    """Облегченное чтение для API: только RESULT_COLUMNS, строки-кортежи вместо ORM-объектов"""
+    result = await session.execute(build_query(filters, order_by, limit, columns=RESULT_COLUMNS))
+    return result.all()
@@ -0,0 +1,96 @@
+"""
+Сравнение скорости чтения результатов торгов: ORM-объекты + pydantic
+против выборки только нужных колонок (fetch_results).
+
+Запуск на сгенерированных данных в SQLite в памяти:
+    python -m src.databases.query_benchmark --rows 50000
+Против PostgreSQL из .env (таблица уже заполнена парсером):
+    python -m src.databases.query_benchmark --db
+Печатает строк в секунду для каждого способа, включая сериализацию в JSON.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.models.trading_results_model import SpimexTradingResults, Base
+
+
+def generate_rows(count: int) -> list[dict]:
+    start = date(2024, 1, 1)
+    return [
+        {
+            'exchange_product_id': f"A{i % 500:03d}NVY060F",
+            'exchange_product_name': "Бензин (АИ-92-К5)",
+            'oil_id': f"A{i % 50:03d}",
+            'delivery_basis_id': "NVY",
+            'delivery_basis_name': "Новоярославская",
+            'delivery_type_id': "F",
+            'volume': 120 + i % 7,
+            'total': 11722920 + i,
+            'count': i % 10 + 1,
+            'date': start + timedelta(days=i // 500),
+        }
+        for i in range(count)
+    ]
+
+
+async def measure(session_factory, repeat: int) -> dict[str, float]:
+    # Импорт здесь: модули API читают конфиг (.env) при импорте
+    from src.databases.database import base_query, fetch_results
+    from src.schemas.trading_result_schema import TradingResult, trading_result_from_row
+    from src.services.cache_service import serialize_response
+
+    order_by = (desc(SpimexTradingResults.date), desc(SpimexTradingResults.id))
+
+    async def orm_path(session):
+        rows = await base_query(session, order_by=order_by)
+        return len(rows), serialize_response([TradingResult.model_validate(row) for row in rows])
+
+    async def columns_path(session):
+        rows = await fetch_results(session, order_by=order_by)
+        return len(rows), serialize_response([trading_result_from_row(row) for row in rows])
+
+    results = {}
+    for name, path in (('orm + model_validate', orm_path), ('columns + dict', columns_path)):
+        best = float('inf')
+        for _ in range(repeat):
+            async with session_factory() as session:  # Новая сессия - пустая identity map
+                started = time.perf_counter()
+                count, _ = await path(session)
+                best = min(best, time.perf_counter() - started)
+        results[name] = count / best if best else 0.0
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help="сколько строк сгенерировать для SQLite")
+    parser.add_argument('--repeat', type=int, default=5, help="сколько прогонов, берется лучший")
+    parser.add_argument('--db', action='store_true', help="мерить на PostgreSQL из .env")
+    args = parser.parse_args()
+    logging.getLogger('aiosqlite').setLevel(logging.WARNING)  # Не засоряем вывод логами драйвера
+
+    if args.db:
+        from src.databases.database import engine
+    else:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(SpimexTradingResults.__table__.insert(), generate_rows(args.rows))
+
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    results = await measure(session_factory, args.repeat)
+    await engine.dispose()
+
+    baseline = next(iter(results.values()))
+    for name, rate in results.items():
+        print(f"{name:<22} {rate:>12,.0f} строк/с  x{rate / baseline:.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Проверка, что запросы API используют индексы из миграций.
+
+Запуск против PostgreSQL из .env:
+    python -m src.databases.query_plans
+Для каждого запроса печатается план (EXPLAIN) и использованные индексы;
+если какой-то запрос читает таблицу целиком (Seq Scan) или досортировывает
+строки поверх индекса (Sort, Incremental Sort), код выхода 1.
+"""
+import asyncio
+import json
+import sys
+from datetime import date
+from typing import Any
+
+from sqlalchemy import select, text
+from sqlalchemy.sql import Select
+
+from src.databases.database import RESULT_COLUMNS, build_query
+from src.models.trading_results_model import SpimexTradingResults, SpimexTradingDays
+from src.services.pagination import KEYSET_ORDER, encode_cursor, keyset_filter
+
+# Узлы плана, которых не должно быть: чтение всей таблицы и досортировка страницы
+# (порядок keyset-пагинации должен браться из индекса)
+PROBLEM_NODES = ('Seq Scan', 'Sort', 'Incremental Sort')
+
+
+def representative_queries() -> dict[str, Select]:
+    """Запросы в том виде, в каком их строят эндпоинты API (колонки fetch_results, порядок KEYSET_ORDER)"""
+    model = SpimexTradingResults
+
+    def page(filters, limit):
+        return build_query(filters, KEYSET_ORDER, limit, columns=RESULT_COLUMNS)
+
+    return {
+        'last_trading_dates': (
+            select(SpimexTradingDays.date).order_by(SpimexTradingDays.date.desc()).limit(5)
+        ),
+        'dynamics_by_dates': page([model.date >= date(2024, 1, 1), model.date <= date(2024, 3, 31)], 101),
+        'dynamics_by_oil_id': page(
+            [model.date >= date(2024, 1, 1), model.date <= date(2024, 12, 31), model.oil_id == 'A100'], 101
+        ),
+        'dynamics_next_page': page(
+            [model.oil_id == 'A100', *keyset_filter(encode_cursor(date(2024, 6, 1), 1000))], 101
+        ),
+        'trading_results_by_basis': page([model.delivery_basis_id == 'UFM'], 11),
+        'trading_results_by_type_and_basis': page([model.delivery_type_id == 'F', model.delivery_basis_id == 'UFM'], 11),
+    }
+
+
+def collect_plan_nodes(plan: dict[str, Any]) -> list[dict[str, Any]]:
+    """Разворачивает дерево плана PostgreSQL (EXPLAIN FORMAT JSON) в список узлов"""
+    nodes = [plan]
+    for child in plan.get('Plans', []):
+        nodes.extend(collect_plan_nodes(child))
+    return nodes
+
+
+def plan_problems(nodes: list[dict[str, Any]]) -> list[str]:
+    """Типы узлов плана из PROBLEM_NODES, без повторов"""
+    return list(dict.fromkeys(n['Node Type'] for n in nodes if n['Node Type'] in PROBLEM_NODES))
+
+
+async def main() -> int:
+    from src.databases.database import engine
+
+    ok = True
+    async with engine.connect() as conn:
+        for name, stmt in representative_queries().items():
+            sql = stmt.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            raw = result.scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+
+            nodes = collect_plan_nodes(plan)
+            indexes = sorted({n['Index Name'] for n in nodes if 'Index Name' in n})
+            problems = plan_problems(nodes)
+            ok = ok and not problems
+
+            status = 'OK' if not problems else ', '.join(problems).upper()
+            print(f"[{status}] {name}: {', '.join(indexes) or 'индексы не используются'}")
+            print(f"    {' -> '.join(n['Node Type'] for n in nodes)}")
+
+    await engine.dispose()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
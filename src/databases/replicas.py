@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+import logging
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики PostgreSQL в секундах. Если все принятое WAL уже применено,
+# реплика догнала основную БД, даже если последняя транзакция была давно
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaRouter:
+    """
+    Раздает сессии чтения по репликам по кругу. Реплика, не прошедшая проверку
+    (недоступна или отстает больше max_lag), исключается до следующей успешной
+    проверки. Если живых реплик нет, чтение идет в основную БД.
+    """
+
+    def __init__(
+            self,
+            primary: AsyncEngine,
+            replicas: Sequence[AsyncEngine] = (),
+            check_timeout: float = 2.0,
+            max_lag: float = 30.0,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.check_timeout = check_timeout
+        self.max_lag = max_lag
+        self.healthy = list(self.replicas)
+        self._counter = itertools.count()
+        self._sessionmakers = {
+            engine: async_sessionmaker(bind=engine, expire_on_commit=False)
+            for engine in [primary, *self.replicas]
+        }
+
+    def pick(self) -> AsyncEngine:
+        healthy = self.healthy
+        if not healthy:
+            return self.primary
+        return healthy[next(self._counter) % len(healthy)]
+
+    def session(self, engine: AsyncEngine) -> AsyncSession:
+        return self._sessionmakers[engine]()
+
+    def mark_down(self, engine: AsyncEngine) -> None:
+        """Исключает реплику после ошибки соединения - вернет ее следующая проверка"""
+        if engine in self.healthy:
+            logger.warning(f"Реплика {engine.url.host} исключена после ошибки соединения")
+            self.healthy = [replica for replica in self.healthy if replica is not engine]
+
+    async def _is_healthy(self, replica: AsyncEngine) -> bool:
+        try:
+            async with asyncio.timeout(self.check_timeout):
+                async with replica.connect() as conn:
+                    if replica.dialect.name != 'postgresql':
+                        await conn.execute(text("SELECT 1"))
+                        return True
+                    lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        except Exception as e:
+            # Любая ошибка проверки (в том числе драйвера, не обернутая SQLAlchemy) - реплика недоступна,
+            # а не упавшая проверка всех реплик
+            logger.warning(f"Реплика {replica.url.host} недоступна: {str(e)}")
+            return False
+        if lag is not None and lag > self.max_lag:
+            logger.warning(f"Реплика {replica.url.host} отстает на {lag:.1f} с")
+            return False
+        return True
+
+    async def check(self) -> None:
+        """Проверяет все реплики параллельно и обновляет список живых"""
+        results = await asyncio.gather(*(self._is_healthy(replica) for replica in self.replicas))
+        self.healthy = [replica for replica, ok in zip(self.replicas, results) if ok]
+
+    async def run_checks(self, interval: float) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                # Фоновая задача не должна умирать: иначе список живых реплик застынет
+                logger.error(f"Ошибка проверки реплик: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.dispose()
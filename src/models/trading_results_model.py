@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime
+from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
 
@@ -26,3 +26,64 @@ class SpimexTradingResults(Base):
     created_on = Column(DateTime, default=datetime.now)  # Когда запись была создана (автоматически при добавлении)
     updated_on = Column(DateTime, default=datetime.now,
                         onupdate=datetime.now)  # Когда запись была обновлена (автоматически при изменении)
+
+    __table_args__ = (
+        # Одна запись на продукт за торговый день
+        UniqueConstraint('exchange_product_id', 'date', name='uq_spimex_trading_results_product_date'),
+        # Все индексы заканчиваются на (date, id) - порядок keyset-пагинации
+        # (date DESC, id DESC), чтобы страница читалась из индекса без сортировки.
+        # /dynamics только по датам
+        Index('ix_spimex_trading_results_date_id', 'date', 'id'),
+        # /dynamics и /trading_results: фильтр по измерению + диапазон дат, сортировка по дате.
+        # Остальные измерения в INCLUDE, чтобы дополнительные фильтры проверялись по индексу
+        Index('ix_spimex_trading_results_oil_id_date_id', 'oil_id', 'date', 'id',
+              postgresql_include=['delivery_basis_id', 'delivery_type_id']),
+        Index('ix_spimex_trading_results_delivery_basis_id_date_id', 'delivery_basis_id', 'date', 'id',
+              postgresql_include=['oil_id', 'delivery_type_id']),
+        Index('ix_spimex_trading_results_delivery_type_id_date_id', 'delivery_type_id', 'date', 'id',
+              postgresql_include=['oil_id', 'delivery_basis_id']),
+    )
+
+
+# Справочник торговых дней: строка на загруженный бюллетень, ведет парсер.
+# /last_trading_dates читает его вместо DISTINCT по всей таблице результатов
+class SpimexTradingDays(Base):
+    __tablename__ = 'spimex_trading_days'
+
+    date = Column(Date, primary_key=True)  # Дата торгов
+    rows_count = Column(Integer, nullable=False)  # Сколько строк результатов за день
+    total_volume = Column(Numeric(20, 2), nullable=False)  # Суммарный объем торгов за день (в тоннах)
+    ingested_at = Column(DateTime, nullable=False, default=datetime.now)  # Когда бюллетень загружен
+    source_url = Column(String(512))  # Адрес файла бюллетеня
+    content_hash = Column(String(64))  # SHA-256 файла: инкрементальный запуск парсера пропускает неизмененные
+
+
+# Бюллетени, найденные парсером, но еще не загруженные: упавшие в прошлых запусках
+# инкрементальный парсер загружает снова
+class SpimexPendingBulletins(Base):
+    __tablename__ = 'spimex_pending_bulletins'
+
+    date = Column(Date, primary_key=True)  # Дата торгов
+    url = Column(String(512), nullable=False)  # Адрес файла бюллетеня
+    listed_at = Column(DateTime, nullable=False, default=datetime.now)  # Когда найден в списке
+
+
+class RollupColumns:
+    """Колонки витрин: период, измерения продукта и суммы за период"""
+    date = Column(Date, primary_key=True)  # День (для месячной витрины - первое число месяца)
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(1), primary_key=True)
+    volume = Column(Numeric(20, 2), nullable=False)  # Суммарный объем (в тоннах)
+    total = Column(Numeric(20, 2), nullable=False)  # Суммарный оборот (в рублях)
+    count = Column(Integer, nullable=False)  # Число сделок
+
+
+# Витрины для /aggregates: парсер пересчитывает их только за даты загруженного бюллетеня,
+# поэтому аналитика читает сотни готовых строк вместо всей таблицы результатов
+class SpimexDailyRollups(RollupColumns, Base):
+    __tablename__ = 'spimex_daily_rollups'
+
+
+class SpimexMonthlyRollups(RollupColumns, Base):
+    __tablename__ = 'spimex_monthly_rollups'
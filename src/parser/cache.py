@@ -0,0 +1,23 @@
+import logging
+
+from redis.asyncio import Redis
+
+from config import REDIS_HOST, REDIS_PORT, DATA_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+
+async def bump_data_version() -> None:
+    """
+    Увеличивает версию данных в Redis после успешной загрузки.
+    API включает версию в ключи кеша, поэтому сразу начинает отдавать новые данные.
+    """
+    redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+    try:
+        version = await redis.incr(DATA_VERSION_KEY)
+        logger.info(f"Версия данных в кеше обновлена: {version}")
+    except Exception as e:
+        # Ошибка Redis не должна ломать загрузку - кеш сбросится по TTL
+        logger.error(f"Не удалось обновить версию данных в кеше: {str(e)}")
+    finally:
+        await redis.aclose()
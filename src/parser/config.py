@@ -11,6 +11,44 @@ DB_PORT = os.environ.get('DB_PORT')  # Порт для подключения
 DB_USER = os.environ.get('DB_USER')  # Имя пользователя БД
 DB_PASS = os.environ.get('DB_PASSWORD')  # Пароль пользователя БД
 
+# Настройки Redis (кеш API)
+REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')  # Адрес сервера Redis
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))  # Порт Redis
+
+# Ключ версии данных: API включает ее в ключи кеша
+DATA_VERSION_KEY = 'spimex:data_version'
+
+# Прогрев кеша API после загрузки
+API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000')  # Адрес API
+POPULAR_QUERIES_KEY = 'spimex:popular_queries'  # Частота запросов к API
+WARMUP_HEADER = 'X-Cache-Warmup'  # Запросы прогрева API не учитывает в статистике
+WARMUP_TOP_N = int(os.environ.get('WARMUP_TOP_N', 20))  # Сколько самых частых запросов прогревать
+# Запросы, которые прогреваются всегда (через запятую)
+WARMUP_QUERIES = [q for q in os.environ.get('WARMUP_QUERIES', '/last_trading_dates').split(',') if q]
+WARMUP_CONCURRENCY = int(os.environ.get('WARMUP_CONCURRENCY', 4))  # Одновременных запросов к API
+WARMUP_DELAY = float(os.environ.get('WARMUP_DELAY', 2))  # Пауза, чтобы API увидел новую версию (сек)
+WARMUP_HISTORY_LIMIT = 1000  # Сколько запросов хранить в статистике
+
+# Сколько строк бюллетеня отправлять в БД одним INSERT ... ON CONFLICT
+# (у asyncpg лимит 32767 параметров на запрос: 12 колонок на строку)
+UPSERT_BATCH_SIZE = int(os.environ.get('UPSERT_BATCH_SIZE', 1000))
+
+# Конвейер загрузки: скачивание -> разбор XLS -> запись в БД.
+# У каждого этапа свое число воркеров, между этапами очереди ограниченной длины
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 8))  # Одновременных скачиваний с spimex.com
+# Процессов для разбора XLS (работа только с CPU, в процессах не блокирует загрузку и запись)
+PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', os.cpu_count() or 1))
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', PARSE_PROCESSES))  # Одновременно разбираемых файлов
+WRITE_WORKERS = int(os.environ.get('WRITE_WORKERS', 4))  # Одновременных транзакций (пул БД - 20 соединений)
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 16))  # Длина очереди перед разбором и записью
+PIPELINE_REPORT_INTERVAL = float(os.environ.get('PIPELINE_REPORT_INTERVAL', 10))  # Как часто писать статистику (сек)
+
+# HTTP-клиент: одна сессия на весь запуск, соединения с spimex.com переиспользуются
+HTTP_CONNECTION_LIMIT = int(os.environ.get('HTTP_CONNECTION_LIMIT', 20))  # Всего открытых соединений
+HTTP_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_CONNECTIONS_PER_HOST', 8))  # Соединений к одному хосту
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', 30))  # Сколько держать простаивающее соединение (сек)
+HTTP_DNS_CACHE_TTL = int(os.environ.get('HTTP_DNS_CACHE_TTL', 300))  # Сколько кешировать DNS-ответ (сек)
+
 # Год, с которого начинаем сбор данных (чтобы не парсить старые данные)
 START_YEAR = 2023
 
@@ -0,0 +1,26 @@
+import aiohttp
+
+from config import HTTP_CONNECTION_LIMIT, HTTP_CONNECTIONS_PER_HOST, HTTP_KEEPALIVE_TIMEOUT, HTTP_DNS_CACHE_TTL
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def create_http_session(
+        limit: int = HTTP_CONNECTION_LIMIT,
+        limit_per_host: int = HTTP_CONNECTIONS_PER_HOST,
+) -> aiohttp.ClientSession:
+    """
+    HTTP-сессия на весь запуск парсера: страницы со списком и все файлы бюллетеней
+    идут через один пул соединений, поэтому DNS-запрос и TLS-рукопожатие
+    делаются один раз на соединение, а не на каждый файл.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(connector=connector, headers=HEADERS)
@@ -1,12 +1,17 @@
+import argparse
 import asyncio
 import time
 import logging
-from asyncio import Semaphore
 from datetime import datetime
 
 # Импортируем наши функции
 from parser import get_all_bulletin_links
-from save_to_database import process_spimex_bulletins
+from http_client import create_http_session
+from pipeline import run_pipeline
+from database import AsyncSessionLocal
+from save_to_database import load_ingested_bulletins, load_pending_bulletins, mark_pending, clear_pending
+from cache import bump_data_version
+from warmup import warm_cache
 
 # Настраиваем логирование
 logging.basicConfig(
@@ -14,31 +19,65 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-DB_CONCURRENCY_LIMIT = 10
-db_semaphore = Semaphore(DB_CONCURRENCY_LIMIT)
 
 
-async def async_main():
-    """Основная асинхронная функция приложения"""
+async def async_main(full: bool = False):
+    """
+    Основная асинхронная функция приложения.
+    По умолчанию загрузка инкрементальная: берутся бюллетени, которых нет в журнале загрузок,
+    и бюллетени из очереди незагруженных (упавшие в прошлых запусках). Список обходится до первой
+    страницы, целиком загруженной раньше, но не выше самой старой даты из очереди, а файлы
+    с тем же хешем, что в журнале, не разбираются.
+    full=True - полная перезагрузка с START_YEAR.
+    """
     start_time = time.time()  # Засекаем время начала
 
     logger.info("🟢 Запускаем парсер Spimex")
 
-    # 1. Получаем список всех бюллетеней
-    logger.info("🔍 Ищем бюллетени на сайте Spimex...")
-    bulletin_list = await get_all_bulletin_links()
-    logger.info(f"Найдено {len(bulletin_list)} бюллетеней для обработки")
-
-    # 2. Обрабатываем бюллетени и сохраняем в БД
-    logger.info("Начинаем обработку бюллетеней...")
-    async with db_semaphore:  # Ожидает, если уже есть 10 активных задач
-        try:
-            # Создаем список задач на обработку каждого бюллетеня
-            tasks = [process_spimex_bulletins(bulletin) for bulletin in bulletin_list]
-            await asyncio.gather(*tasks)
-        except Exception as e:
-            logger.error(f"Ошибка при обработке бюллетеня: {e}")
-            raise
+    # 0. Журнал уже загруженных бюллетеней (дата -> хеш файла)
+    known_hashes = {}
+    pending = set()
+    if not full:
+        async with AsyncSessionLocal() as db_session:
+            known_hashes = await load_ingested_bulletins(db_session)
+            pending = await load_pending_bulletins(db_session)
+    if known_hashes:
+        logger.info(f"Инкрементальная загрузка: в журнале {len(known_hashes)} дней, последний - {max(known_hashes)}, "
+                    f"не загружено в прошлых запусках - {len(pending)}")
+
+    # Одна HTTP-сессия на весь запуск: соединения с spimex.com переиспользуются
+    async with create_http_session() as http_session:
+        # 1. Получаем список всех бюллетеней
+        logger.info("🔍 Ищем бюллетени на сайте Spimex...")
+        bulletin_list = await get_all_bulletin_links(http_session, known_hashes, pending)
+        logger.info(f"Найдено {len(bulletin_list)} бюллетеней для обработки")
+
+        # До загрузки: если бюллетень упадет или запуск прервется, следующий запуск его найдет
+        async with AsyncSessionLocal() as db_session:
+            await mark_pending(db_session, bulletin_list)
+            await db_session.commit()
+
+        # 2. Обрабатываем бюллетени и сохраняем в БД
+        logger.info("Начинаем обработку бюллетеней...")
+        stages = await run_pipeline(http_session, bulletin_list, known_hashes)
+
+    failed = {bulletin['date'] for stage in stages for bulletin in stage.failed_bulletins}
+    if failed:
+        logger.warning(f"Не удалось обработать бюллетеней: {len(failed)}, они будут загружены в следующий раз")
+    async with AsyncSessionLocal() as db_session:
+        await clear_pending(db_session, [bulletin['date'] for bulletin in bulletin_list if bulletin['date'] not in failed])
+        await db_session.commit()
+
+    # Новых или измененных бюллетеней нет - кеш API остается актуальным
+    if stages[-1].done:
+        # 3. Сообщаем API, что данные обновились
+        await bump_data_version()
+
+        # 4. Прогреваем кеш популярных запросов до прихода клиентов
+        logger.info("Прогреваем кеш API...")
+        await warm_cache()
+    else:
+        logger.info("Новых данных нет, версия данных и кеш API не меняются")
 
     # Выводим время выполнения
     duration = time.time() - start_time
@@ -47,8 +86,11 @@ async def async_main():
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Загрузка бюллетеней Spimex в БД")
+    arg_parser.add_argument('--full', action='store_true', help="перезагрузить все бюллетени с START_YEAR")
+    args = arg_parser.parse_args()
     try:
-        asyncio.run(async_main())
+        asyncio.run(async_main(args.full))
     except KeyboardInterrupt:
         logger.info("🛑 Приложение остановлено пользователем")
     except Exception as e:
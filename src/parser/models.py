@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime
+from sqlalchemy import Column, Integer, String, Numeric, Date, DateTime, UniqueConstraint
 from datetime import datetime
 from database import Base
 
@@ -46,3 +46,81 @@ class SpimexTradingResult(Base):
 
     # Когда запись была обновлена (автоматически при изменении)
     updated_on = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # Одна запись на продукт за торговый день (индексы - в миграциях API)
+    __table_args__ = (
+        UniqueConstraint('exchange_product_id', 'date', name='uq_spimex_trading_results_product_date'),
+    )
+
+
+# Справочник торговых дней: строка на загруженный бюллетень (таблица - в миграциях API)
+class SpimexTradingDay(Base):
+    __tablename__ = 'spimex_trading_days'
+
+    # Дата торгов
+    date = Column(Date, primary_key=True)
+
+    # Сколько строк результатов за день
+    rows_count = Column(Integer, nullable=False)
+
+    # Суммарный объем торгов за день (в тоннах)
+    total_volume = Column(Numeric(20, 2), nullable=False)
+
+    # Когда бюллетень загружен
+    ingested_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    # Откуда загружен бюллетень и SHA-256 файла: неизмененный файл повторно не разбирается
+    source_url = Column(String(512))
+    content_hash = Column(String(64))
+
+
+# Бюллетени, найденные в списке, но еще не загруженные (таблица - в миграциях API).
+# Пишутся до загрузки и удаляются после нее, поэтому упавший (или прерванный) бюллетень
+# остается здесь, и инкрементальный запуск обходит список до него
+class SpimexPendingBulletin(Base):
+    __tablename__ = 'spimex_pending_bulletins'
+
+    # Дата торгов
+    date = Column(Date, primary_key=True)
+
+    # Адрес файла бюллетеня
+    url = Column(String(512), nullable=False)
+
+    # Когда бюллетень найден в списке
+    listed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+
+# Витрина: суммы по дню и измерениям продукта (таблица - в миграциях API)
+class SpimexDailyRollup(Base):
+    __tablename__ = 'spimex_daily_rollups'
+
+    # День торгов
+    date = Column(Date, primary_key=True)
+
+    # Измерения продукта
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(1), primary_key=True)
+
+    # Суммарный объем (в тоннах), оборот (в рублях) и число сделок
+    volume = Column(Numeric(20, 2), nullable=False)
+    total = Column(Numeric(20, 2), nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+# Витрина: суммы по месяцу и измерениям продукта, date - первое число месяца
+class SpimexMonthlyRollup(Base):
+    __tablename__ = 'spimex_monthly_rollups'
+
+    # Первое число месяца
+    date = Column(Date, primary_key=True)
+
+    # Измерения продукта
+    oil_id = Column(String(10), primary_key=True)
+    delivery_basis_id = Column(String(10), primary_key=True)
+    delivery_type_id = Column(String(1), primary_key=True)
+
+    # Суммарный объем (в тоннах), оборот (в рублях) и число сделок
+    volume = Column(Numeric(20, 2), nullable=False)
+    total = Column(Numeric(20, 2), nullable=False)
+    count = Column(Integer, nullable=False)
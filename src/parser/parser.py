@@ -1,15 +1,13 @@
 import aiohttp
 from bs4 import BeautifulSoup
-from datetime import datetime
+from datetime import date, datetime
+from typing import Collection, Optional
 from urllib.parse import urljoin
 from config import START_YEAR
 import asyncio
 import logging
 
 BASE_URL = 'https://spimex.com'
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-}
 
 logger = logging.getLogger(__name__)
 
@@ -110,27 +108,52 @@ async def parse_bulletin_page(session: aiohttp.ClientSession, page_num: int) ->
         return [], False
 
 
-async def get_all_bulletin_links() -> list:
-    """Получает все ссылки на бюллетени"""
+async def get_all_bulletin_links(
+        session: aiohttp.ClientSession,
+        known_dates: Optional[Collection[date]] = None,
+        pending_dates: Collection[date] = (),
+) -> list:
+    """
+    Получает все ссылки на бюллетени. Если задан known_dates (даты из журнала загрузок),
+    берет только бюллетени, которых нет в журнале, бюллетени из pending_dates (не загрузились
+    в прошлых запусках) и бюллетень последней загруженной даты (его файл могли перевыложить).
+    Список идет от новых к старым, поэтому обход прекращается на первой странице, все бюллетени
+    которой уже в журнале, но не раньше, чем дойдет до самой старой даты из pending_dates.
+    """
     all_links = []
     page_num = 1
     stop_flag = False
-
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
-        while not stop_flag:
-            try:
-                bulletins, should_stop = await parse_bulletin_page(session, page_num)
+    latest = max(known_dates) if known_dates else None
+    oldest_pending = min(pending_dates) if pending_dates else None
+
+    while not stop_flag:
+        try:
+            bulletins, should_stop = await parse_bulletin_page(session, page_num)
+            page_known = False
+            if known_dates:
+                page_known = all(
+                    bulletin['date'] in known_dates or bulletin['date'] in pending_dates for bulletin in bulletins
+                )
+                # Страница новее незагруженного бюллетеня - он на следующих страницах
+                if page_known and oldest_pending and bulletins:
+                    page_known = min(bulletin['date'] for bulletin in bulletins) <= oldest_pending
+                all_links.extend(
+                    bulletin for bulletin in bulletins
+                    if bulletin['date'] not in known_dates or bulletin['date'] in pending_dates
+                    or bulletin['date'] == latest
+                )
+            else:
                 all_links.extend(bulletins)
 
-                if should_stop or not bulletins:
-                    stop_flag = True
-                else:
-                    page_num += 1
-
-            except Exception as e:
-                logger.error(f"Ошибка обработки страницы {page_num}: {str(e)}")
+            if should_stop or page_known or not bulletins:
                 stop_flag = True
+            else:
+                page_num += 1
+
+        except Exception as e:
+            logger.error(f"Ошибка обработки страницы {page_num}: {str(e)}")
+            stop_flag = True
 
     all_links.sort(key=lambda x: x['date'], reverse=True)
     logger.info(f"Всего найдено бюллетеней: {len(all_links)}")
-    return all_links
\ No newline at end of file
+    return all_links
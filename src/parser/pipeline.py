@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from config import (
+    DOWNLOAD_WORKERS, PARSE_WORKERS, PARSE_PROCESSES, WRITE_WORKERS, PIPELINE_QUEUE_SIZE, PIPELINE_REPORT_INTERVAL,
+)
+from database import AsyncSessionLocal
+from parser import download_file
+from save_to_database import bulletin_date, parse_bulletin, save_bulletin
+
+logger = logging.getLogger(__name__)
+
+# Обработчик этапа: получает бюллетень и результат прошлого этапа,
+# возвращает вход следующего (None - дальше бюллетень не идет)
+Handler = Callable[[Dict[str, Any], Any], Awaitable[Any]]
+
+
+class StageStats:
+    """Счетчики этапа конвейера: готово, с ошибкой и сколько времени воркеры были заняты"""
+
+    def __init__(self, name: str, workers: int, inbox: asyncio.Queue):
+        self.name = name
+        self.workers = workers
+        self.inbox = inbox
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0  # Обработаны, но дальше не переданы (файл не изменился, нет данных)
+        self.busy = 0.0
+        self.failed_bulletins: List[Dict[str, Any]] = []  # Остаются в очереди незагруженных
+
+    def report(self, elapsed: float) -> str:
+        # Загрузка около 100% - этап узкое место: его очередь полна, очередь следующего пуста
+        rate = self.done / elapsed if elapsed else 0.0
+        load = self.busy / (self.workers * elapsed) if elapsed else 0.0
+        size = self.inbox.maxsize or '-'
+        return (f"{self.name}: {self.done} готово, {self.skipped} пропущено, {self.failed} ошибок, {rate:.2f}/с, "
+                f"загрузка {load:.0%}, очередь {self.inbox.qsize()}/{size}")
+
+
+async def stage_worker(stats: StageStats, handle: Handler, outbox: Optional[asyncio.Queue]) -> None:
+    """
+    Берет бюллетени из очереди этапа и передает результат в очередь следующего.
+    Если следующая очередь полна, воркер ждет - так медленный этап притормаживает быстрые.
+    """
+    while True:
+        bulletin, payload = await stats.inbox.get()
+        try:
+            started = time.perf_counter()
+            try:
+                result = await handle(bulletin, payload)
+            except Exception as e:
+                stats.failed += 1
+                stats.failed_bulletins.append(bulletin)
+                logger.error(f"Этап {stats.name}: бюллетень за {bulletin_date(bulletin)} пропущен: {str(e)}")
+                continue
+            finally:
+                stats.busy += time.perf_counter() - started
+            stats.done += 1
+            if outbox is None:
+                continue
+            if result is None:
+                stats.skipped += 1
+            else:
+                await outbox.put((bulletin, result))
+        finally:
+            # Только после передачи дальше: join() этапа означает, что все уже в следующей очереди
+            stats.inbox.task_done()
+
+
+async def report_progress(stages: List[StageStats], started: float) -> None:
+    while True:
+        await asyncio.sleep(PIPELINE_REPORT_INTERVAL)
+        elapsed = time.perf_counter() - started
+        logger.info("Конвейер: " + "; ".join(stage.report(elapsed) for stage in stages))
+
+
+async def run_pipeline(
+        http_session: aiohttp.ClientSession,
+        bulletins: List[Dict[str, Any]],
+        known_hashes: Optional[Dict[date, Optional[str]]] = None,
+) -> List[StageStats]:
+    """
+    Загружает бюллетени конвейером: скачивание -> разбор XLS -> запись в БД.
+    Этапы работают одновременно, у каждого свое число воркеров (DOWNLOAD_WORKERS,
+    PARSE_WORKERS, WRITE_WORKERS), между этапами очереди длиной PIPELINE_QUEUE_SIZE.
+    Разбор XLS идет в пуле из PARSE_PROCESSES процессов, чтобы не блокировать event loop.
+    Ошибка в бюллетене не останавливает остальные - она учитывается в статистике этапа.
+    known_hashes - журнал загрузок (дата -> SHA-256 файла): файл с тем же хешем не разбирается.
+    """
+    known_hashes = known_hashes or {}
+
+    async def download(bulletin: Dict[str, Any], _) -> Optional[bytes]:
+        file_content = await download_file(http_session, bulletin['url'])
+        if not file_content:
+            return None
+        bulletin['content_hash'] = hashlib.sha256(file_content).hexdigest()
+        if known_hashes.get(bulletin['date']) == bulletin['content_hash']:
+            logger.info(f"Бюллетень за {bulletin_date(bulletin)} не изменился, пропускаем")
+            return None
+        return file_content
+
+    async def parse(bulletin: Dict[str, Any], file_content: bytes) -> Optional[List[Tuple]]:
+        logger.info(f"Обрабатываем бюллетень за {bulletin_date(bulletin)}")
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(parse_pool, parse_bulletin, file_content, bulletin['date'])
+        if not records:
+            logger.info(f"Нет данных для обработки в бюллетене за {bulletin_date(bulletin)}")
+            return None
+        return records
+
+    async def write(bulletin: Dict[str, Any], records: List[Tuple]) -> None:
+        async with AsyncSessionLocal() as db_session:
+            await save_bulletin(db_session, bulletin, records)
+
+    # Список бюллетеней известен заранее, поэтому первая очередь без ограничения
+    queues = [asyncio.Queue(), asyncio.Queue(PIPELINE_QUEUE_SIZE), asyncio.Queue(PIPELINE_QUEUE_SIZE)]
+    stages = [
+        StageStats('скачивание', DOWNLOAD_WORKERS, queues[0]),
+        StageStats('разбор', PARSE_WORKERS, queues[1]),
+        StageStats('запись', WRITE_WORKERS, queues[2]),
+    ]
+    handlers = [download, parse, write]
+    outboxes = [queues[1], queues[2], None]
+
+    for bulletin in bulletins:
+        queues[0].put_nowait((bulletin, None))
+
+    parse_pool = ProcessPoolExecutor(PARSE_PROCESSES)
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(stage_worker(stage, handle, outbox))
+        for stage, handle, outbox in zip(stages, handlers, outboxes)
+        for _ in range(stage.workers)
+    ]
+    tasks.append(asyncio.create_task(report_progress(stages, started)))
+    try:
+        # Этап заканчивается, когда закончился предыдущий и его очередь разобрана
+        for queue in queues:
+            await queue.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        parse_pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    for stage in stages:
+        logger.info(f"Итог {stage.report(elapsed)}")
+    return stages
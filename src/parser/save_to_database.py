@@ -1,17 +1,17 @@
-import aiohttp
 import pandas as pd
-from typing import List, Tuple, Optional, Dict, Any
+from typing import Collection, List, Tuple, Optional, Dict, Any, Set
 import logging
 import io
-import asyncio
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import SpimexTradingResult  # Наша модель данных
-from database import AsyncSessionLocal
-from parser import HEADERS, download_file
-from sqlalchemy import select, and_, cast, Date
-from datetime import datetime as dt
+from models import (  # Наши модели данных
+    SpimexTradingResult, SpimexTradingDay, SpimexPendingBulletin, SpimexDailyRollup, SpimexMonthlyRollup,
+)
+from config import UPSERT_BATCH_SIZE
+from sqlalchemy import select, cast, Date, func, delete, insert, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import date, datetime as dt, timedelta
 
 # Настраиваем логирование
 logger = logging.getLogger(__name__)
@@ -66,7 +66,7 @@ def clean_and_filter_data(df: pd.DataFrame, count_column: str) -> pd.DataFrame:
     return df
 
 
-async def panda_filter(file_content: bytes) -> pd.DataFrame:
+def panda_filter(file_content: bytes) -> pd.DataFrame:
     """
     Обрабатывает XLS-файл и извлекает данные в DataFrame
     """
@@ -108,108 +108,204 @@ async def panda_filter(file_content: bytes) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-def parse_row(row: Tuple, date: str) -> Optional[Dict[str, Any]]:
-    """Парсит одну строку данных в формат для БД."""
+# Порядок полей в записи, которую возвращает parse_row
+RESULT_FIELDS = (
+    'exchange_product_id', 'exchange_product_name', 'oil_id', 'delivery_basis_id',
+    'delivery_basis_name', 'delivery_type_id', 'volume', 'total', 'count', 'date',
+)
+
+
+def parse_row(row: Tuple, date: str) -> Optional[Tuple]:
+    """Парсит одну строку данных в запись для БД (значения в порядке RESULT_FIELDS)."""
     try:
         exchange_product_id = str(row[1])
 
         # Преобразуем дату из строки в объект date
         trade_date = dt.strptime(date, '%Y-%m-%d').date() if isinstance(date, str) else date
 
-        return {
-            'exchange_product_id': exchange_product_id,
-            'exchange_product_name': str(row[2]),
-            'oil_id': exchange_product_id[:4],
-            'delivery_basis_id': exchange_product_id[4:7],
-            'delivery_basis_name': str(row[3]),
-            'delivery_type_id': exchange_product_id[-1],
-            'volume': float(row[4]) if pd.notna(row[4]) else 0.0,
-            'total': float(row[5]) if pd.notna(row[5]) else 0.0,
-            'count': int(float(row[6])) if pd.notna(row[6]) else 0,
-            'date': trade_date  # Используем объект date
-        }
+        return (
+            exchange_product_id,
+            str(row[2]),
+            exchange_product_id[:4],  # oil_id
+            exchange_product_id[4:7],  # delivery_basis_id
+            str(row[3]),
+            exchange_product_id[-1],  # delivery_type_id
+            float(row[4]) if pd.notna(row[4]) else 0.0,
+            float(row[5]) if pd.notna(row[5]) else 0.0,
+            int(float(row[6])) if pd.notna(row[6]) else 0,
+            trade_date,  # Используем объект date
+        )
     except Exception as e:
         logger.warning(f"Ошибка парсинга строки {row}: {str(e)}")
         return None
 
 
-async def save_to_db(session: AsyncSession, data: Dict[str, Any]) -> None:
+# Колонки, которые обновляются, если строка за (продукт, дату) уже есть
+UPSERT_UPDATE_COLUMNS = [
+    'exchange_product_name', 'oil_id', 'delivery_basis_id', 'delivery_basis_name',
+    'delivery_type_id', 'volume', 'total', 'count', 'updated_on',
+]
+
+
+async def upsert_rows(session: AsyncSession, records: List[Tuple]) -> None:
     """
-    Сохраняет данные в базу (с проверкой на дубликаты)
+    Сохраняет строки бюллетеня пачками по UPSERT_BATCH_SIZE: один
+    INSERT ... ON CONFLICT (exchange_product_id, date) DO UPDATE на пачку
+    вместо SELECT и INSERT/UPDATE на каждую строку. Записи - кортежи в порядке RESULT_FIELDS.
     """
-    try:
-        # Преобразуем строку с датой в объект datetime.date
-        if isinstance(data['date'], str):
-            trade_date = dt.strptime(data['date'], '%Y-%m-%d').date()
-        else:
-            trade_date = data['date']
-
-        # Проверяем, есть ли уже такая запись в БД
-        result = await session.execute(
-            select(SpimexTradingResult).where(
-                and_(
-                    SpimexTradingResult.exchange_product_id == data['exchange_product_id'],
-                    SpimexTradingResult.date == trade_date  # Используем объект даты напрямую
-                )
-            )
+    # Повтор продукта в бюллетене: остается последняя строка (одна строка
+    # не может обновиться дважды в одном INSERT ... ON CONFLICT)
+    unique_records = {(record[0], record[-1]): record for record in records}
+    now = dt.now()
+    rows = [dict(zip(RESULT_FIELDS, record), created_on=now, updated_on=now) for record in unique_records.values()]
+
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = pg_insert(SpimexTradingResult).values(rows[start:start + UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            constraint='uq_spimex_trading_results_product_date',
+            set_={column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS},
         )
-        existing_record = result.scalar_one_or_none()
+        await session.execute(stmt)
 
-        if existing_record:
-            # Если запись существует - обновляем ее
-            for key, value in data.items():
-                setattr(existing_record, key, value)
-        else:
-            # Если записи нет - создаем новую
-            data_obj = SpimexTradingResult(**data)
-            session.add(data_obj)
 
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных в БД: {str(e)}")
-        raise
+async def update_trading_day(
+        session: AsyncSession,
+        trade_date: str,
+        source_url: Optional[str] = None,
+        content_hash: Optional[str] = None,
+) -> None:
+    """
+    Пересчитывает строку справочника торговых дней по сохраненным результатам за дату
+    и запоминает, из какого файла (адрес и SHA-256) она загружена.
+    Вызывается в той же транзакции, что и сохранение бюллетеня.
+    """
+    day = dt.strptime(trade_date, '%Y-%m-%d').date()
+    rows_count, total_volume = (await session.execute(
+        select(func.count(), func.coalesce(func.sum(SpimexTradingResult.volume), 0))
+        .where(SpimexTradingResult.date == day)
+    )).one()
+    await session.merge(
+        SpimexTradingDay(
+            date=day, rows_count=rows_count, total_volume=total_volume, ingested_at=dt.now(),
+            source_url=source_url, content_hash=content_hash,
+        )
+    )
 
 
-async def process_bulletin(session: AsyncSession, bulletin: Dict[str, Any], file_content: bytes) -> None:
-    """Обрабатывает один бюллетень и передаем в функцию save_to_db для сохранения в БД."""
-    try:
-        # Преобразуем дату из бюллетеня в строку формата YYYY-MM-DD
-        trade_date = bulletin['date'].strftime('%Y-%m-%d') if hasattr(bulletin['date'], 'strftime') else bulletin[
-            'date']
+async def load_ingested_bulletins(session: AsyncSession) -> Dict[date, Optional[str]]:
+    """Журнал загрузок: дата торгов -> SHA-256 файла, из которого она загружена"""
+    result = await session.execute(select(SpimexTradingDay.date, SpimexTradingDay.content_hash))
+    return dict(result.all())
+
+
+async def load_pending_bulletins(session: AsyncSession) -> Set[date]:
+    """Даты бюллетеней, найденных в прошлых запусках, но так и не загруженных"""
+    result = await session.execute(select(SpimexPendingBulletin.date))
+    return set(result.scalars().all())
+
+
+async def mark_pending(session: AsyncSession, bulletins: List[Dict[str, Any]]) -> None:
+    """Записывает бюллетени в очередь до загрузки: упавший останется в ней до следующего запуска"""
+    if not bulletins:
+        return
+    values = [{'date': bulletin['date'], 'url': bulletin['url']} for bulletin in bulletins]
+    stmt = pg_insert(SpimexPendingBulletin).values(values)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=['date'],
+        set_={'url': stmt.excluded.url, 'listed_at': stmt.excluded.listed_at},
+    ))
+
+
+async def clear_pending(session: AsyncSession, dates: Collection[date]) -> None:
+    """Убирает из очереди бюллетени, которые загружены (или пропущены как неизмененные)"""
+    if dates:
+        await session.execute(delete(SpimexPendingBulletin).where(SpimexPendingBulletin.date.in_(list(dates))))
 
-        logger.info(f"Обрабатываем бюллетень за {trade_date}")
 
-        df = await panda_filter(file_content)
+ROLLUP_COLUMNS = ['date', 'oil_id', 'delivery_basis_id', 'delivery_type_id', 'volume', 'total', 'count']
 
-        if df.empty:
-            logger.info(f"Нет данных для обработки в бюллетене за {trade_date}")
-            return
 
-        for row in df.itertuples(index=True, name='Pandas'):
-            data = parse_row(row, trade_date)
-            if data:
-                await save_to_db(session, data)
+async def refresh_rollups(session: AsyncSession, trade_date: str) -> None:
+    """
+    Пересчитывает витрины только за дату бюллетеня: дневную - из строк результатов
+    за этот день, месячную - из дневной витрины за его месяц (до ~31 дня готовых сумм).
+    """
+    day = dt.strptime(trade_date, '%Y-%m-%d').date()
+    results = SpimexTradingResult
+    await session.execute(delete(SpimexDailyRollup).where(SpimexDailyRollup.date == day))
+    await session.execute(
+        insert(SpimexDailyRollup).from_select(
+            ROLLUP_COLUMNS,
+            select(
+                results.date,
+                results.oil_id,
+                results.delivery_basis_id,
+                results.delivery_type_id,
+                func.coalesce(func.sum(results.volume), 0),
+                func.coalesce(func.sum(results.total), 0),
+                func.coalesce(func.sum(results.count), 0),
+            )
+            .where(
+                results.date == day,
+                results.oil_id.isnot(None),
+                results.delivery_basis_id.isnot(None),
+                results.delivery_type_id.isnot(None),
+            )
+            .group_by(results.date, results.oil_id, results.delivery_basis_id, results.delivery_type_id)
+        )
+    )
+
+    month_start = day.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    # Бюллетени одного месяца грузятся параллельно: пересчет месяца - по очереди,
+    # чтобы каждый видел дневные суммы уже закоммиченных соседей
+    await session.execute(select(func.pg_advisory_xact_lock(month_start.year * 100 + month_start.month)))
+    daily = SpimexDailyRollup
+    await session.execute(delete(SpimexMonthlyRollup).where(SpimexMonthlyRollup.date == month_start))
+    await session.execute(
+        insert(SpimexMonthlyRollup).from_select(
+            ROLLUP_COLUMNS,
+            select(
+                literal(month_start, Date),
+                daily.oil_id,
+                daily.delivery_basis_id,
+                daily.delivery_type_id,
+                func.sum(daily.volume),
+                func.sum(daily.total),
+                func.sum(daily.count),
+            )
+            .where(daily.date >= month_start, daily.date < next_month)
+            .group_by(daily.oil_id, daily.delivery_basis_id, daily.delivery_type_id)
+        )
+    )
+
+
+def bulletin_date(bulletin: Dict[str, Any]) -> str:
+    """Дата бюллетеня строкой формата YYYY-MM-DD"""
+    return bulletin['date'].strftime('%Y-%m-%d') if hasattr(bulletin['date'], 'strftime') else bulletin['date']
+
 
+def parse_bulletin(file_content: bytes, trade_date: date) -> List[Tuple]:
+    """
+    Разбирает XLS бюллетеня в записи для БД (пустой список, если данных нет).
+    Работа только с CPU, поэтому конвейер выполняет ее в пуле процессов: наружу
+    возвращаются кортежи, а не DataFrame - их быстро передать между процессами.
+    """
+    df = panda_filter(file_content)
+    return [record for row in df.itertuples(index=True, name='Pandas') if (record := parse_row(row, trade_date))]
+
+
+async def save_bulletin(session: AsyncSession, bulletin: Dict[str, Any], records: List[Tuple]) -> None:
+    """Сохраняет строки бюллетеня, справочник торговых дней и витрины одной транзакцией"""
+    trade_date = bulletin_date(bulletin)
+    try:
+        await upsert_rows(session, records)
+        await update_trading_day(session, trade_date, bulletin.get('url'), bulletin.get('content_hash'))
+        await refresh_rollups(session, trade_date)
         await session.commit()
         logger.info(f"Успешно обработан бюллетень за {trade_date}")
 
     except Exception as e:
         await session.rollback()
-        logger.error(f"Ошибка при обработке бюллетеня за {bulletin['date']}: {str(e)}")
+        logger.error(f"Ошибка при обработке бюллетеня за {trade_date}: {str(e)}")
         raise
-
-
-async def process_spimex_bulletins(bulletin) -> None:
-    # Создаем HTTP-сессию для загрузки файлов
-    async with aiohttp.ClientSession(headers=HEADERS) as http_session:
-        tasks = []
-
-        try:
-            # Загружаем файл асинхронно
-            file_content = await download_file(http_session, bulletin['url'])
-        except Exception as e:
-            logger.error(f"Не удалось загрузить бюллетень за {bulletin['date']}: {str(e)}")
-            return  # Пропускаем этот бюллетень
-
-        async with AsyncSessionLocal() as db_session:
-            if file_content:
-                await process_bulletin(db_session, bulletin, file_content)
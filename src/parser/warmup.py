@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from typing import List
+
+import aiohttp
+from redis.asyncio import Redis
+
+from config import (
+    REDIS_HOST, REDIS_PORT, API_BASE_URL, POPULAR_QUERIES_KEY, WARMUP_TOP_N,
+    WARMUP_QUERIES, WARMUP_CONCURRENCY, WARMUP_DELAY, WARMUP_HISTORY_LIMIT, WARMUP_HEADER,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def get_popular_queries(redis: Redis, top_n: int = WARMUP_TOP_N) -> List[str]:
+    """Возвращает самые частые запросы к API и обрезает хвост статистики"""
+    queries = await redis.zrevrange(POPULAR_QUERIES_KEY, 0, top_n - 1)
+    await redis.zremrangebyrank(POPULAR_QUERIES_KEY, 0, -WARMUP_HISTORY_LIMIT - 1)
+    return [q.decode() if isinstance(q, bytes) else q for q in queries]
+
+
+async def warm_query(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, query: str) -> bool:
+    """Запрашивает один адрес API, чтобы тот положил ответ в кеш"""
+    async with semaphore:
+        try:
+            async with session.get(
+                    f"{API_BASE_URL}{query}",
+                    headers={WARMUP_HEADER: '1'},  # Иначе прогреваемые запросы сами держали бы себя в топе
+                    timeout=aiohttp.ClientTimeout(total=60),
+            ) as response:
+                await response.read()
+                return response.status == 200
+        except Exception as e:
+            logger.warning(f"Не удалось прогреть {query}: {str(e)}")
+            return False
+
+
+async def warm_cache() -> None:
+    """Прогревает кеш API: постоянные запросы из конфига + самые популярные"""
+    start_time = time.time()
+
+    # Даем воркерам API перечитать новую версию данных
+    await asyncio.sleep(WARMUP_DELAY)
+
+    redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+    try:
+        popular = await get_popular_queries(redis)
+    except Exception as e:
+        logger.error(f"Не удалось получить популярные запросы из Redis: {str(e)}")
+        popular = []
+    finally:
+        await redis.aclose()
+
+    # Сохраняем порядок и убираем дубликаты
+    queries = list(dict.fromkeys(WARMUP_QUERIES + popular))
+    if not queries:
+        logger.info("Нет запросов для прогрева кеша")
+        return
+
+    semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+    async with aiohttp.ClientSession() as session:
+        results = await asyncio.gather(*[warm_query(session, semaphore, q) for q in queries])
+
+    duration = time.time() - start_time
+    logger.info(f"🔥 Прогрето {sum(results)} из {len(queries)} запросов за {duration:.2f} секунд")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(warm_cache())
@@ -0,0 +1,46 @@
+from typing import Any, Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from src.configs.config import config
+
+
+# Параметры повторяют query-параметры эндпоинтов (те же значения по умолчанию),
+# чтобы запрос из пакета попадал в тот же ключ кеша, что и отдельный запрос
+class DynamicsParams(BaseModel):
+    oil_id: Optional[str] = None
+    delivery_type_id: Optional[str] = None
+    delivery_basis_id: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    limit: int = Field(default=config.api.DEFAULT_PAGE_SIZE, ge=1, le=config.api.MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    format: Literal['json'] = 'json'  # Потоковая выгрузка в пакете недоступна
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class TradingResultsParams(BaseModel):
+    oil_id: Optional[str] = None
+    delivery_type_id: Optional[str] = None
+    delivery_basis_id: Optional[str] = None
+    limit: int = Field(default=10, ge=1, le=config.api.MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+
+    model_config = ConfigDict(extra='forbid')
+
+
+class BatchQuery(BaseModel):
+    id: str  # Ключ результата в ответе
+    endpoint: Literal['dynamics', 'trading_results']
+    params: dict[str, Any] = {}
+
+
+class BatchRequest(BaseModel):
+    queries: list[BatchQuery] = Field(min_length=1, max_length=config.api.MAX_BATCH_SIZE)
+
+    @model_validator(mode='after')
+    def unique_ids(self):
+        ids = [query.id for query in self.queries]
+        if len(ids) != len(set(ids)):
+            raise ValueError("id запросов в пакете должны быть уникальными")
+        return self
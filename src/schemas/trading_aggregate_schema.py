@@ -0,0 +1,13 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class TradingAggregate(BaseModel):
+    period_start: str  # Первый день периода (YYYY-MM-DD)
+    oil_id: Optional[str] = None  # Измерения есть в ответе, только если по ним группировали
+    delivery_basis_id: Optional[str] = None
+    delivery_type_id: Optional[str] = None
+    volume: float  # Суммарный объем (в тоннах)
+    total: float  # Суммарный оборот (в рублях)
+    count: int  # Число сделок
+    vwap: Optional[float]  # Средневзвешенная по объему цена: total / volume
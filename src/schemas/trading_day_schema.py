@@ -0,0 +1,17 @@
+from datetime import date, datetime
+from pydantic import BaseModel, field_validator, ConfigDict
+
+
+class TradingDay(BaseModel):
+    date: str
+    rows_count: int
+    total_volume: float
+    ingested_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator('date', mode='before')
+    def parse_date(cls, value):
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
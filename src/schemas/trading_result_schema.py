@@ -1,5 +1,6 @@
 from datetime import date
 from pydantic import BaseModel, field_validator, ConfigDict
+from decimal import Decimal
 from typing import Any
 import json
 
@@ -33,3 +34,22 @@ class TradingResult(BaseModel):
 
     def json_serializable(self) -> dict[str, Any]:
         return json.loads(self.model_dump_json())
+
+
+TRADING_RESULT_FIELDS = tuple(TradingResult.model_fields)
+
+
+def trading_result_from_row(row: Any) -> dict[str, Any]:
+    """
+    Ответ в формате TradingResult из строки запроса, колонки которой идут
+    в порядке полей схемы (лишние колонки в конце, например id, отбрасываются).
+    Без ORM-объекта и валидации pydantic: Numeric -> float, дата -> ISO-строка.
+    """
+    result = {}
+    for name, value in zip(TRADING_RESULT_FIELDS, row):
+        if isinstance(value, Decimal):
+            value = float(value)
+        elif isinstance(value, date):
+            value = value.isoformat()
+        result[name] = value
+    return result
@@ -0,0 +1,123 @@
+import time
+from contextlib import contextmanager
+from typing import Any
+
+# Границы корзин гистограммы задержек Redis (сек)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            'buckets': {str(bound): n for bound, n in zip(self.buckets, self.counts)},
+        }
+
+
+class CacheMetrics:
+    """Счетчики кеша одного закешированного эндпоинта"""
+
+    def __init__(self):
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.hits_stale = 0
+        self.misses = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.redis_latency: dict[str, LatencyHistogram] = {}
+
+    @contextmanager
+    def redis_timer(self, operation: str):
+        """Замеряет время операции Redis и кладет его в гистограмму"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram = self.redis_latency.setdefault(operation, LatencyHistogram())
+            histogram.observe(time.perf_counter() - start)
+
+    def stats(self) -> dict[str, Any]:
+        hits = self.hits_local + self.hits_redis
+        total = hits + self.misses
+        return {
+            'hits_local': self.hits_local,
+            'hits_redis': self.hits_redis,
+            'hits_stale': self.hits_stale,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'redis_latency': {op: h.stats() for op, h in self.redis_latency.items()},
+        }
+
+
+class MetricsRegistry:
+    """Метрики кеша по эндпоинтам (префикс ключа + имя функции)"""
+
+    def __init__(self):
+        self._metrics: dict[tuple[str, str], CacheMetrics] = {}
+
+    def get(self, prefix: str, function: str) -> CacheMetrics:
+        return self._metrics.setdefault((prefix, function), CacheMetrics())
+
+    def clear(self) -> None:
+        self._metrics.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {f"{prefix}:{function}": m.stats() for (prefix, function), m in self._metrics.items()}
+
+    def prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = [
+            '# HELP spimex_cache_requests_total Cache lookups by result',
+            '# TYPE spimex_cache_requests_total counter',
+        ]
+        for (prefix, function), m in self._metrics.items():
+            labels = f'function="{function}",prefix="{prefix}"'
+            for result, value in (('hit_local', m.hits_local), ('hit_redis', m.hits_redis), ('miss', m.misses)):
+                lines.append(f'spimex_cache_requests_total{{{labels},result="{result}"}} {value}')
+
+        for name, attr, help_text in (
+                ('spimex_cache_stale_hits_total', 'hits_stale', 'Hits served stale while refreshing'),
+                ('spimex_cache_errors_total', 'errors', 'Redis errors in the cache layer'),
+                ('spimex_cache_read_bytes_total', 'bytes_read', 'Bytes read from Redis'),
+                ('spimex_cache_written_bytes_total', 'bytes_written', 'Bytes written to Redis'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (prefix, function), m in self._metrics.items():
+                lines.append(f'{name}{{function="{function}",prefix="{prefix}"}} {getattr(m, attr)}')
+
+        lines.append('# HELP spimex_cache_redis_latency_seconds Redis command latency')
+        lines.append('# TYPE spimex_cache_redis_latency_seconds histogram')
+        for (prefix, function), m in self._metrics.items():
+            for operation, h in m.redis_latency.items():
+                labels = f'function="{function}",prefix="{prefix}",operation="{operation}"'
+                for bound, n in zip(h.buckets, h.counts):
+                    lines.append(f'spimex_cache_redis_latency_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'spimex_cache_redis_latency_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f'spimex_cache_redis_latency_seconds_sum{{{labels}}} {h.sum}')
+                lines.append(f'spimex_cache_redis_latency_seconds_count{{{labels}}} {h.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+cache_metrics = MetricsRegistry()
@@ -1,17 +1,28 @@
 import math
+import random
+import time as time_module
+import uuid
+from collections import OrderedDict
 from datetime import time, datetime, timedelta
-from redis.asyncio import Redis
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.exceptions import RedisError
 import asyncio
-import json
+import hashlib
+import inspect
 import logging
+import struct
+import zlib
+from contextlib import asynccontextmanager
+from decimal import Decimal
 from functools import wraps
-from fastapi import Request
-from typing import Any, TypeVar, Type, Optional, Callable
+import orjson
+from fastapi import Request, Response
+from typing import Any, Optional, Callable, Awaitable, NamedTuple
 from pydantic import BaseModel
 
 from src.configs.config import config
-
-T = TypeVar('T', bound=BaseModel)
+from src.databases.database import get_read_session
+from src.services.cache_metrics import CacheMetrics, cache_metrics
 
 
 logger = logging.getLogger(__name__)
@@ -20,19 +31,45 @@ logging.basicConfig(level=config.log.loging_default_lavel)
 # Конфигурация кеширования
 CACHE_RESET_TIME = time(14, 11)  # Время сброса кеша (14:11)
 REDIS_URL = config.redis.REDIS_URL
+DATA_VERSION_KEY = "spimex:data_version"  # Счетчик версии данных, увеличивается парсером
+POPULAR_QUERIES_KEY = "spimex:popular_queries"  # Частота запросов для прогрева кеша
+WARMUP_HEADER = "X-Cache-Warmup"  # Этим заголовком прогрев помечает свои запросы - они не учитываются
 
 
 def init_redis() -> Redis:
-    """Инициализация подключения к Redis"""
-    return Redis.from_url(REDIS_URL, decode_responses=True)
+    """Инициализация клиента Redis с общим ограниченным пулом соединений"""
+    pool = BlockingConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=config.redis.REDIS_MAX_CONNECTIONS,
+        timeout=config.redis.REDIS_POOL_TIMEOUT,
+        socket_timeout=config.redis.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=config.redis.REDIS_SOCKET_CONNECT_TIMEOUT,
+    )
+    return Redis(connection_pool=pool)
+
+
+async def close_redis(redis: Redis) -> None:
+    """Закрытие клиента Redis вместе с его пулом соединений"""
+    await redis.aclose(close_connection_pool=True)
+
 
-def get_seconds_until_tomorrow_1411():
+def get_redis(request: Request) -> Redis:
+    """Возвращает общий клиент Redis приложения (создается в lifespan)"""
+    redis = getattr(request.app.state, 'redis', None)
+    if redis is None:
+        # lifespan не запускался (например, приложение поднято без него) -
+        # создаем клиент один раз и переиспользуем его дальше
+        redis = init_redis()
+        request.app.state.redis = redis
+    return redis
+
+def get_seconds_until_cache_reset() -> int:
+    """Секунды до ближайшего ежедневного сброса кеша (CACHE_RESET_TIME)"""
     now = datetime.now()
-    tomorrow = now.date() + timedelta(days=1)
-    target_time = datetime.combine(tomorrow, datetime.strptime(
-        config.redis.CACHE_RESET_TIME,
-        "%H:%M").time()
-                                   )
+    reset_time = datetime.strptime(config.redis.CACHE_RESET_TIME, "%H:%M").time()
+    target_time = datetime.combine(now.date(), reset_time)
+    if target_time <= now:
+        target_time += timedelta(days=1)
     delta = target_time - now
     return math.ceil(delta.total_seconds())
 
@@ -57,60 +94,668 @@ def get_seconds_until_tomorrow_1411():
 #             logger.info(f"Очищено {len(keys)} ключей кеша")
 
 
+class LocalCache:
+    """
+    LRU-кеш в памяти процесса (L1) перед Redis.
+
+    Ограничен по количеству ключей и по суммарному размеру значений,
+    каждая запись отдается не дольше своего TTL. Просроченная запись
+    еще stale_grace секунд доступна через get_stale(). Размер записи -
+    длина готового JSON-тела ответа в байтах.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, stale_grace: float = 0):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.stale_grace = stale_grace
+        self._data: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value, size = entry
+        now = time_module.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_grace <= now:
+                self._pop(key)
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_stale(self, key: str) -> Any:
+        """Возвращает значение, даже если его TTL истек не более stale_grace секунд назад"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value, size = entry
+        if expires_at + self.stale_grace <= time_module.monotonic():
+            self._pop(key)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: float, size: int) -> None:
+        if ttl is None or ttl <= 0 or size > self.max_bytes or self.max_items <= 0:
+            return
+
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (time_module.monotonic() + ttl, value, size)
+        self._bytes += size
+
+        # Вытесняем самые давно использованные записи
+        while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._pop(oldest)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'items': len(self._data),
+            'max_items': self.max_items,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _pop(self, key: str) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+
+# Один L1-кеш на процесс (воркер), общий для всех запросов
+local_cache = LocalCache(
+    max_items=config.redis.LOCAL_CACHE_MAX_ITEMS,
+    max_bytes=config.redis.LOCAL_CACHE_MAX_BYTES,
+    stale_grace=config.redis.CACHE_STALE_GRACE,
+)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вычисления одного ключа внутри процесса:
+    первый вызов запускает вычисление, остальные ждут его результат.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+        else:
+            logger.debug('Ключ уже вычисляется, ждем результат')
+
+        # shield: отмена одного запроса не должна отменять общее вычисление
+        return await asyncio.shield(future)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+
+single_flight = SingleFlight()
+
+
+class DataVersion:
+    """
+    Версия данных, которую парсер увеличивает после каждой загрузки.
+    Версия входит в ключ кеша, поэтому новые данные отдаются сразу
+    после загрузки, а старые ключи просто истекают по TTL.
+    Значение кешируется в процессе на refresh_interval секунд.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._value: Optional[int] = None
+        self._checked_at = 0.0
+
+    async def get(self, redis: Redis) -> int:
+        now = time_module.monotonic()
+        if self._value is None or now - self._checked_at >= self.refresh_interval:
+            try:
+                self._value = int(await redis.get(DATA_VERSION_KEY) or 0)
+            except (ValueError, TypeError):
+                self._value = 0
+            except RedisError as e:
+                logger.error(f"Не удалось прочитать версию данных: {str(e)}")
+                self._value = self._value or 0
+            self._checked_at = now
+        return self._value
+
+    def reset(self) -> None:
+        self._value = None
+        self._checked_at = 0.0
+
+
+data_version = DataVersion(refresh_interval=config.redis.CACHE_VERSION_REFRESH)
+
+# Удаляет блокировку, только если она все еще наша
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _json_default(value: Any) -> Any:
+    """Типы, которые orjson не сериализует сам"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def serialize_response(data: Any) -> bytes:
+    """Сериализует результат эндпоинта в готовое JSON-тело ответа"""
+    return orjson.dumps(data, default=_json_default)
+
+
+class CachedResponse(NamedTuple):
+    """Результат эндпоинта вместе с заголовками ответа, которые кешируются вместе с телом"""
+    data: Any
+    headers: dict[str, str]
+
+
+class CacheEntry(NamedTuple):
+    body: bytes  # Готовое JSON-тело ответа
+    fresh_until: float  # До какого момента (unix time) значение свежее
+    expires_at: float  # Когда значение удаляется совсем (жесткий TTL)
+    headers: Optional[dict[str, str]] = None  # Заголовки ответа (например, X-Next-Cursor)
+
+    @property
+    def is_stale(self) -> bool:
+        return time_module.time() >= self.fresh_until
+
+
+# Заголовок записи кеша: маркер формата + fresh_until + expires_at.
+# Маркер говорит, сжато ли тело и идут ли после заголовка заголовки
+# ответа (длина + JSON). JSON не начинается с байтов 0x01-0x04,
+# поэтому записи без заголовка читаются как есть
+ENTRY_MARKER = b'\x01'
+ENTRY_MARKER_COMPRESSED = b'\x02'
+ENTRY_MARKER_HEADERS = b'\x03'
+ENTRY_MARKER_HEADERS_COMPRESSED = b'\x04'
+COMPRESSED_MARKERS = (ENTRY_MARKER_COMPRESSED, ENTRY_MARKER_HEADERS_COMPRESSED)
+HEADERS_MARKERS = (ENTRY_MARKER_HEADERS, ENTRY_MARKER_HEADERS_COMPRESSED)
+ENTRY_HEADER = struct.Struct('>cdd')
+HEADERS_LENGTH = struct.Struct('>H')
+
+
+def pack_entry(
+        body: bytes,
+        fresh_until: float,
+        expires_at: float,
+        compress: bool = False,
+        headers: Optional[dict[str, str]] = None,
+) -> bytes:
+    if compress:
+        body = zlib.compress(body, config.redis.CACHE_COMPRESSION_LEVEL)
+    if headers:
+        marker = ENTRY_MARKER_HEADERS_COMPRESSED if compress else ENTRY_MARKER_HEADERS
+        meta = orjson.dumps(headers)
+        return ENTRY_HEADER.pack(marker, fresh_until, expires_at) + HEADERS_LENGTH.pack(len(meta)) + meta + body
+    marker = ENTRY_MARKER_COMPRESSED if compress else ENTRY_MARKER
+    return ENTRY_HEADER.pack(marker, fresh_until, expires_at) + body
+
+
+def unpack_entry(raw: bytes) -> CacheEntry:
+    marker = raw[:1]
+    if marker in (ENTRY_MARKER, *COMPRESSED_MARKERS, *HEADERS_MARKERS):
+        _, fresh_until, expires_at = ENTRY_HEADER.unpack_from(raw)
+        offset = ENTRY_HEADER.size
+        headers = None
+        if marker in HEADERS_MARKERS:
+            (length,) = HEADERS_LENGTH.unpack_from(raw, offset)
+            offset += HEADERS_LENGTH.size
+            headers = orjson.loads(raw[offset:offset + length])
+            offset += length
+        body = raw[offset:]
+        if marker in COMPRESSED_MARKERS:
+            body = zlib.decompress(body)
+        return CacheEntry(body, fresh_until, expires_at, headers)
+    # Старая запись без заголовка - свежая до ближайшего сброса
+    expires_at = time_module.time() + get_seconds_until_cache_reset()
+    return CacheEntry(raw, expires_at, expires_at)
+
+
+class CompressionStats:
+    """Сколько байт тел ответов сжато и во сколько они обошлись в Redis"""
+
+    def __init__(self):
+        self.entries = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def add(self, raw_size: int, stored_size: int) -> None:
+        self.entries += 1
+        self.raw_bytes += raw_size
+        self.stored_bytes += stored_size
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'entries': self.entries,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'ratio': round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else 0.0,
+        }
+
+
+compression_stats = CompressionStats()
+
+
 class CacheService:
-    def __init__(self, redis: Redis):
+    """
+    Кеш готовых JSON-тел ответов: в памяти процесса (L1) и в Redis.
+    Значения хранятся и отдаются как bytes, без повторной валидации.
+    У записи два срока: после мягкого (expire) она считается устаревшей,
+    но еще отдается, после жесткого (expire + stale_ttl) удаляется.
+    Тела больше CACHE_COMPRESSION_THRESHOLD байт хранятся в Redis сжатыми,
+    в L1 - всегда несжатыми, чтобы попадания в память не тратили CPU.
+    Ошибки Redis считаются в метриках и не роняют запрос: кеш просто пропускается.
+    """
+
+    def __init__(self, redis: Redis, local: LocalCache = local_cache, metrics: Optional[CacheMetrics] = None):
         self.redis = redis
+        self.local = local
+        self.metrics = metrics or CacheMetrics()
 
-    async def get(self, key: str, model: Type[T] = None) -> Any:
-        cached = await self.redis.get(key)
-        if not cached:
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        if (local := self.local.get(key)) is not None:
+            logger.debug('Кеш найден в памяти процесса')
+            self.metrics.hits_local += 1
+            return unpack_entry(local)
+
+        entry = await self._read(key)
+        if entry is None:
             logger.debug('Нет такого ключа')
+            self.metrics.misses += 1
             return None
 
+        logger.debug('Кеш найден, отдаем кеш')
+        self.metrics.hits_redis += 1
+        return entry
+
+    async def _read(self, key: str) -> Optional[CacheEntry]:
+        """Читает запись из Redis и кладет ее в L1"""
         try:
-            data = json.loads(cached)
-            if model and issubclass(model, BaseModel):
-                if isinstance(data, list):
-                    return [model.model_validate(item) for item in data]
-                return model.model_validate(data)
-            logger.debug('Кеш найден, отдаем кеш')
-            return data
-        except json.JSONDecodeError:
+            with self.metrics.redis_timer('get'):
+                cached = await self.redis.get(key)
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка чтения кеша {key}: {str(e)}")
+            return None
+        if not cached:
             return None
+        return self._remember(key, cached)
 
-    async def set(self, key: str, data: Any, expire: int = None):
-        if isinstance(data, BaseModel):
-            to_cache = data.json_serializable()
-        elif isinstance(data, list) and len(data) > 0 and isinstance(data[0], BaseModel):
-            to_cache = [item.json_serializable() for item in data]
-        else:
-            to_cache = data
+    def _remember(self, key: str, cached: bytes) -> CacheEntry:
+        """Распаковывает запись из Redis и кладет ее в L1 несжатой"""
+        self.metrics.bytes_read += len(cached)
+        entry = unpack_entry(cached)
+        if cached[:1] in COMPRESSED_MARKERS:
+            cached = pack_entry(entry.body, entry.fresh_until, entry.expires_at, headers=entry.headers)
+        # Кладем в L1 на оставшийся срок жизни записи в Redis
+        self.local.set(key, cached, entry.expires_at - time_module.time(), len(cached))
+        return entry
+
+    async def get_many(
+            self,
+            keys: list[str],
+            metrics: Optional[list[CacheMetrics]] = None,
+    ) -> list[Optional[CacheEntry]]:
+        """
+        Как get для нескольких ключей: что не нашлось в L1, читается из Redis одним MGET.
+        metrics - метрики для каждого ключа (ключи разных эндпоинтов), по умолчанию - свои.
+        """
+        metrics = metrics or [self.metrics] * len(keys)
+        entries: list[Optional[CacheEntry]] = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            if (local := self.local.get(key)) is not None:
+                metrics[i].hits_local += 1
+                entries[i] = unpack_entry(local)
+            else:
+                missing.append(i)
+        if not missing:
+            return entries
+
+        try:
+            with self.metrics.redis_timer('mget'):
+                values = await self.redis.mget([keys[i] for i in missing])
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка чтения кеша ({len(missing)} ключей): {str(e)}")
+            values = [None] * len(missing)
+
+        for i, cached in zip(missing, values):
+            if cached:
+                metrics[i].hits_redis += 1
+                entries[i] = self._remember(keys[i], cached)
+            else:
+                metrics[i].misses += 1
+        return entries
+
+    async def set(
+            self,
+            key: str,
+            body: bytes,
+            expire: int,
+            stale_ttl: int = 0,
+            headers: Optional[dict[str, str]] = None,
+    ) -> CacheEntry:
         logger.debug('Устанавливаем кеш')
-        await self.redis.set(key, json.dumps(to_cache), ex=expire)
+        now = time_module.time()
+        fresh_until, expires_at = now + expire, now + expire + stale_ttl
+        raw = pack_entry(body, fresh_until, expires_at, headers=headers)
+
+        stored = raw
+        threshold = config.redis.CACHE_COMPRESSION_THRESHOLD
+        if 0 < threshold <= len(body):
+            stored = pack_entry(body, fresh_until, expires_at, compress=True, headers=headers)
+            compression_stats.add(len(raw), len(stored))
+            logger.debug(f'Тело ответа сжато: {len(raw)} -> {len(stored)} байт')
+
+        self.local.set(key, raw, expire + stale_ttl, len(raw))
+        try:
+            with self.metrics.redis_timer('set'):
+                await self.redis.set(key, stored, ex=expire + stale_ttl)
+            self.metrics.bytes_written += len(stored)
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка записи кеша {key}: {str(e)}")
+        return CacheEntry(body, fresh_until, expires_at, headers)
+
+    async def acquire_lock(self, key: str) -> Optional[str]:
+        """
+        Пытается взять короткую блокировку на пересчет ключа, возвращает токен.
+        Если Redis недоступен, возвращает пустой токен - считаем без блокировки.
+        """
+        token = uuid.uuid4().hex
+        try:
+            with self.metrics.redis_timer('lock'):
+                acquired = await self.redis.set(
+                    f"lock:{key}", token, nx=True, px=int(config.redis.CACHE_LOCK_TIMEOUT * 1000)
+                )
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка блокировки {key}: {str(e)}")
+            return ""
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if not token:
+            return
+        try:
+            with self.metrics.redis_timer('unlock'):
+                await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка снятия блокировки {key}: {str(e)}")
+
+    async def record_query(self, signature: str, weight: float = 1) -> None:
+        """Учитывает запрос в статистике частоты - по ней парсер прогревает кеш"""
+        try:
+            await self.redis.zincrby(POPULAR_QUERIES_KEY, weight, signature)
+        except RedisError as e:
+            self.metrics.errors += 1
+            logger.error(f"Ошибка записи статистики запросов: {str(e)}")
+
+    def record_hit(self, signature: str) -> None:
+        """
+        Учитывает попадание в кеш без ожидания ответа Redis. Попаданий много, поэтому
+        пишется только доля CACHE_HIT_SAMPLE_RATE из них с весом 1 / доля -
+        в среднем счетчик тот же, что при записи каждого попадания.
+        """
+        rate = config.redis.CACHE_HIT_SAMPLE_RATE
+        if rate > 0 and random.random() < rate:
+            run_in_background(self.record_query(signature, 1 / rate))
+
+    async def wait_for(self, key: str) -> Optional[CacheEntry]:
+        """Ждет, пока другой воркер положит значение в кеш"""
+        deadline = time_module.monotonic() + config.redis.CACHE_LOCK_WAIT
+        while time_module.monotonic() < deadline:
+            await asyncio.sleep(config.redis.CACHE_LOCK_POLL_INTERVAL)
+            if (cached := await self._read(key)) is not None:
+                return cached
+        return None
+
+
+@asynccontextmanager
+async def background_session(request: Request):
+    """
+    Отдельная сессия БД для работы после ответа обработчика (фоновое обновление
+    кеша, потоковая выгрузка): сессия запроса закрывается раньше.
+    Учитывает dependency_overrides приложения.
+    """
+    provider = request.app.dependency_overrides.get(get_read_session, get_read_session)
+    if inspect.isasyncgenfunction(provider):
+        async with asynccontextmanager(provider)() as session:
+            yield session
+    else:
+        yield await provider()
+
+
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro: Awaitable[Any]) -> None:
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def query_signature(request: Request) -> Optional[str]:
+    """Адрес запроса для статистики прогрева; None - запрос самого прогрева"""
+    if request.headers.get(WARMUP_HEADER):
+        return None
+    signature = request.url.path
+    if request.url.query:
+        signature += f"?{request.url.query}"
+    return signature
+
+
+def json_response(entry: CacheEntry) -> Response:
+    return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+
+
+def build_cache_key(key_prefix: str, version: int, name: str, params: dict[str, Any]) -> str:
+    """
+    Строит короткий стабильный ключ кеша.
+    Параметры со значением None отбрасываются, остальные сортируются
+    по имени, даты приводятся к ISO-формату, результат хешируется.
+    """
+    canonical = orjson.dumps(
+        {k: v for k, v in params.items() if v is not None},
+        default=_json_default,
+        option=orjson.OPT_SORT_KEYS,
+    )
+    digest = hashlib.blake2b(canonical, digest_size=8).hexdigest()
+    return f"{key_prefix}:v{version}:{name}:{digest}"
+
+
+class CachedEndpoint:
+    """
+    Логика кеширования одного эндпоинта (см. cache_response). Вынесена в объект,
+    чтобы пакетный эндпоинт строил те же ключи и пересчитывал промахи так же.
+    """
+
+    def __init__(
+            self,
+            func: Callable[..., Awaitable[Any]],
+            key_prefix: str,
+            expire: Optional[int],
+            key_params: Optional[Callable[[dict[str, Any]], dict[str, Any]]],
+            stale_ttl: int,
+    ):
+        self.func = func
+        self.key_prefix = key_prefix
+        self.expire = expire
+        self.key_params = key_params
+        self.stale_ttl = stale_ttl
+
+    def cache_for(self, request: Request) -> CacheService:
+        return CacheService(get_redis(request), metrics=cache_metrics.get(self.key_prefix, self.func.__name__))
+
+    def cache_key(self, version: int, kwargs: dict[str, Any]) -> str:
+        params = {k: v for k, v in kwargs.items() if k != 'session'}  # Убираем сессию из ключа
+        if self.key_params is not None:
+            params = self.key_params(params)
+        return build_cache_key(self.key_prefix, version, self.func.__name__, params)
+
+    async def compute(self, request: Request, cache: CacheService, cache_key: str,
+                      call_kwargs: dict[str, Any]) -> CacheEntry:
+        result = await self.func(request, **call_kwargs)
+        headers = None
+        if isinstance(result, CachedResponse):
+            result, headers = result.data, result.headers
+        body = serialize_response(result)
+        ttl = self.expire if self.expire is not None else get_seconds_until_cache_reset()
+        return await cache.set(cache_key, body, ttl, self.stale_ttl, headers)
+
+    async def revalidate(self, request: Request, cache: CacheService, cache_key: str,
+                         kwargs: dict[str, Any]) -> None:
+        token = await cache.acquire_lock(cache_key)
+        try:
+            # Устаревшая копия могла остаться только в L1 этого процесса, а в Redis
+            # другой воркер уже положил свежее значение: берем его (_read кладет в L1)
+            current = await cache._read(cache_key)
+            if current is not None and not current.is_stale:
+                logger.debug('Значение уже обновлено другим процессом')
+                return
+            if token is None:
+                return  # Уже обновляет другой процесс
+            if 'session' in kwargs:
+                async with background_session(request) as session:
+                    await self.compute(request, cache, cache_key, {**kwargs, 'session': session})
+            else:
+                await self.compute(request, cache, cache_key, kwargs)
+            logger.debug('Устаревшее значение обновлено в фоне')
+        except Exception as e:
+            logger.error(f"Ошибка фонового обновления кеша {cache_key}: {str(e)}")
+        finally:
+            if token is not None:
+                await cache.release_lock(cache_key, token)
+
+    def serve(self, request: Request, cache: CacheService, cache_key: str,
+              cached: CacheEntry, kwargs: dict[str, Any]) -> CacheEntry:
+        """Попадание в кеш: устаревшее значение отдается сразу и обновляется в фоне"""
+        if cached.is_stale:
+            cache.metrics.hits_stale += 1
+            if not single_flight.in_flight(f"revalidate:{cache_key}"):
+                logger.debug('Отдаем устаревшее значение и обновляем его в фоне')
+                run_in_background(single_flight.do(
+                    f"revalidate:{cache_key}", lambda: self.revalidate(request, cache, cache_key, kwargs)
+                ))
+        return cached
+
+    async def load(self, request: Request, cache: CacheService, cache_key: str,
+                   kwargs: dict[str, Any]) -> CacheEntry:
+        """Промах: пересчет под блокировкой, одинаковые запросы процесса ждут один результат"""
+        async def run():
+            token = await cache.acquire_lock(cache_key)
+            if token is None:
+                # Ключ пересчитывает другой воркер: отдаем устаревшее
+                # значение из памяти, если оно есть, иначе ждем результат
+                logger.debug('Ключ пересчитывается другим процессом')
+                if (stale := cache.local.get_stale(cache_key)) is not None:
+                    logger.debug('Отдаем устаревшее значение из памяти')
+                    return unpack_entry(stale)
+                if (cached := await cache.wait_for(cache_key)) is not None:
+                    return cached
+
+            try:
+                # Пока мы ждали блокировку, ее держатель мог записать значение и отпустить ее
+                if token is not None and (cached := await cache._read(cache_key)) is not None:
+                    logger.debug('Значение уже записано другим процессом')
+                    return cached
+                return await self.compute(request, cache, cache_key, kwargs)
+            finally:
+                if token is not None:
+                    await cache.release_lock(cache_key, token)
+
+        return await single_flight.do(cache_key, run)
+
+    async def __call__(self, request: Request, **kwargs) -> Response:
+        cache = self.cache_for(request)
+        version = await data_version.get(cache.redis)
+        cache_key = self.cache_key(version, kwargs)
+        # Статистика прогрева считает все запросы: промахи - каждый, попадания - выборочно
+        signature = query_signature(request)
+
+        if cached := await cache.get(cache_key):
+            if signature:
+                cache.record_hit(signature)
+            return json_response(self.serve(request, cache, cache_key, cached, kwargs))
+        entry = await self.load(request, cache, cache_key, kwargs)
+        if signature:
+            await cache.record_query(signature)
+        return json_response(entry)
 
 
 def cache_response(
         key_prefix: str = "spimex",
-        expire: int = get_seconds_until_tomorrow_1411(),
-        model: Optional[Callable] = None
+        expire: Optional[int] = None,
+        key_params: Optional[Callable[[dict[str, Any]], dict[str, Any]]] = None,
+        stale_ttl: Optional[int] = None,
+        bypass: Optional[Callable[[dict[str, Any]], bool]] = None,
 ):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(request: Request, *args, **kwargs):
-            cache = CacheService(init_redis())
-            new_kwargs = {k: v for k, v in kwargs.items() if k != 'session'}  # Убираем сессию из ключа
-            cache_key = f"{key_prefix}:{func.__name__}:{str(new_kwargs)}"
-
-            # Получаем модель из аннотаций, если не указана явно
-            response_model = model or func.__annotations__.get('return')
+    """
+    Кеширует ответ эндпоинта в Redis как готовое JSON-тело.
+    Результат сериализуется один раз при промахе, попадания отдаются как есть,
+    минуя валидацию и сериализацию response_model.
+    Если эндпоинт возвращает CachedResponse, его заголовки кешируются вместе с телом.
+    Если expire не указан, TTL считается в момент записи - до ближайшего CACHE_RESET_TIME.
+    key_params приводит параметры запроса к каноническому виду (например,
+    подставляет значения по умолчанию), чтобы одинаковые по смыслу запросы
+    попадали в один ключ.
+    stale_ttl (по умолчанию CACHE_STALE_TTL) - сколько секунд после expire
+    запись еще отдается сразу, пока фоновая задача ее обновляет (stale-while-revalidate).
+    0 отключает этот режим.
+    bypass(params) -> True пропускает кеш: эндпоинт вызывается напрямую и его
+    ответ возвращается как есть (например, потоковая выгрузка).
+    Объект CachedEndpoint доступен как wrapper.cached.
+    """
+    if stale_ttl is None:
+        stale_ttl = config.redis.CACHE_STALE_TTL
 
-            if cached := await cache.get(cache_key, model=response_model):
-                return cached
+    def decorator(func):
+        endpoint = CachedEndpoint(func, key_prefix, expire, key_params, stale_ttl)
 
-            result = await func(request, *args, **kwargs)
-            await cache.set(cache_key, result, expire)
-            return result
+        @wraps(func)
+        async def wrapper(request: Request, **kwargs):
+            if bypass is not None and bypass(kwargs):
+                return await func(request, **kwargs)
+            return await endpoint(request, **kwargs)
 
+        wrapper.cached = endpoint
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,57 @@
+import base64
+import binascii
+from datetime import date
+from typing import Any, Optional, Sequence, TypeVar
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import tuple_, desc
+
+from src.models.trading_results_model import SpimexTradingResults
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Порядок выдачи страниц: ключ (date, id) однозначен, поэтому страницы не пересекаются
+KEYSET_ORDER = (desc(SpimexTradingResults.date), desc(SpimexTradingResults.id))
+
+
+def encode_cursor(row_date: date, row_id: int) -> str:
+    """Непрозрачный курсор: base64 от JSON [дата, id] последней строки страницы"""
+    raw = orjson.dumps([row_date.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        row_date, row_id = orjson.loads(raw)
+        return date.fromisoformat(row_date), int(row_id)
+    except (binascii.Error, orjson.JSONDecodeError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail="Неверный курсор"
+        )
+
+
+def keyset_filter(cursor: Optional[str]) -> list[Any]:
+    """Условие «строки после курсора» для сортировки KEYSET_ORDER"""
+    if not cursor:
+        return []
+    cursor_date, cursor_id = decode_cursor(cursor)
+    return [tuple_(SpimexTradingResults.date, SpimexTradingResults.id) < (cursor_date, cursor_id)]
+
+
+Row = TypeVar('Row')
+
+
+def split_page(rows: Sequence[Row], limit: int) -> tuple[Sequence[Row], dict[str, str]]:
+    """
+    Отрезает страницу из limit + 1 строк (у строк должны быть date и id). Лишняя строка значит, что есть
+    следующая страница - тогда возвращается заголовок с ее курсором.
+    """
+    if len(rows) <= limit:
+        return rows, {}
+    page = rows[:limit]
+    last = page[-1]
+    return page, {NEXT_CURSOR_HEADER: encode_cursor(last.date, last.id)}
@@ -0,0 +1,57 @@
+import csv
+import io
+from typing import Any, AsyncIterator, Iterable
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from src.configs.config import config
+from src.schemas.trading_result_schema import TRADING_RESULT_FIELDS, trading_result_from_row
+from src.services.cache_service import background_session
+
+# Форматы потоковой выгрузки: тип содержимого и расширение файла
+STREAM_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+def ndjson_chunk(items: Iterable[dict[str, Any]]) -> bytes:
+    return b''.join(orjson.dumps(item) + b'\n' for item in items)
+
+
+def csv_chunk(items: Iterable[dict[str, Any]], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(TRADING_RESULT_FIELDS)
+    writer.writerows(item.values() for item in items)
+    return buffer.getvalue().encode()
+
+
+async def stream_rows(request: Request, stmt: Select, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Читает строки (stmt с колонками RESULT_COLUMNS) серверным курсором пачками по STREAM_BATCH_SIZE и сразу
+    отдает их клиенту, не собирая весь результат в памяти.
+    Сессия своя: сессия запроса закрывается до начала отправки тела.
+    """
+    if fmt == 'csv':
+        yield csv_chunk([], header=True)
+
+    async with background_session(request) as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=config.api.STREAM_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            items = [trading_result_from_row(row) for row in rows]
+            yield csv_chunk(items) if fmt == 'csv' else ndjson_chunk(items)
+
+
+def streaming_response(request: Request, stmt: Select, fmt: str, filename: str) -> StreamingResponse:
+    media_type, extension = STREAM_FORMATS[fmt]
+    return StreamingResponse(
+        stream_rows(request, stmt, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'},
+    )
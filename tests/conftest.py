@@ -13,10 +13,16 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from httpx import AsyncClient, ASGITransport
+from unittest.mock import AsyncMock
 
 from main import app
-from src.databases.database import get_session
-from src.models.trading_results_model import SpimexTradingResults, Base
+from src.configs.config import config
+from src.databases.database import get_session, get_read_session
+from src.services.cache_metrics import cache_metrics
+from src.services.cache_service import init_redis, close_redis, local_cache, data_version
+from src.models.trading_results_model import (
+    SpimexTradingResults, SpimexTradingDays, SpimexDailyRollups, SpimexMonthlyRollups, Base
+)
 
 from data import list_models_SpimexTradingResults
 
@@ -33,9 +39,53 @@ async def create_tables():
         await conn.run_sync(Base.metadata.create_all)
 
 
+@pytest.fixture(autouse=True)
+def clear_process_cache():
+    """Сбрасывает кеш в памяти процесса между тестами"""
+    local_cache.clear()
+    data_version.reset()
+    cache_metrics.clear()
+
+
+def build_trading_days(results):
+    """Справочник торговых дней, как его заполняет парсер"""
+    days = {}
+    for row in results:
+        rows_count, total_volume = days.get(row.date, (0, 0))
+        days[row.date] = (rows_count + 1, total_volume + row.volume)
+    return [
+        SpimexTradingDays(date=day, rows_count=rows_count, total_volume=total_volume)
+        for day, (rows_count, total_volume) in days.items()
+    ]
+
+
+def build_rollups(results, model, period_start):
+    """Витрина с суммами по периоду и измерениям продукта, как ее заполняет парсер"""
+    sums = {}
+    for row in results:
+        key = (period_start(row.date), row.oil_id, row.delivery_basis_id, row.delivery_type_id)
+        volume, total, count = sums.get(key, (0, 0, 0))
+        sums[key] = (volume + row.volume, total + row.total, count + row.count)
+    return [
+        model(date=day, oil_id=oil_id, delivery_basis_id=basis_id, delivery_type_id=type_id,
+              volume=volume, total=total, count=count)
+        for (day, oil_id, basis_id, type_id), (volume, total, count) in sums.items()
+    ]
+
+
+# Считаем один раз, пока у объектов данных не истекли атрибуты после commit
+list_models_SpimexTradingDays = build_trading_days(list_models_SpimexTradingResults)
+list_models_rollups = (
+    build_rollups(list_models_SpimexTradingResults, SpimexDailyRollups, lambda day: day)
+    + build_rollups(list_models_SpimexTradingResults, SpimexMonthlyRollups, lambda day: day.replace(day=1))
+)
+
+
 @pytest_asyncio.fixture
 async def add_objects(get_session_fixt):
     get_session_fixt.add_all(list_models_SpimexTradingResults)
+    get_session_fixt.add_all(list_models_SpimexTradingDays)
+    get_session_fixt.add_all(list_models_rollups)
     await get_session_fixt.commit()
 
 
@@ -52,12 +102,35 @@ async def client(get_session_fixt, add_objects):
         return get_session_fixt
 
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_read_session] = override_get_session
+    # ASGITransport не запускает lifespan, поэтому пул Redis создаем сами
+    app.state.redis = init_redis()
 
     client = AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
     yield client
     await client.aclose()
+    await close_redis(app.state.redis)
+    del app.state.redis
     app.dependency_overrides.clear()
 
+
+@pytest_asyncio.fixture
+async def mock_redis(client):
+    """Подменяет общий клиент Redis приложения на AsyncMock с пустым кешем"""
+    real_redis = app.state.redis
+    mock = AsyncMock()
+    mock.get.return_value = None
+    app.state.redis = mock
+    yield mock
+    app.state.redis = real_redis
+
+
+@pytest.fixture
+def admin_headers(monkeypatch):
+    """Включает служебные эндпоинты /cache/* и возвращает заголовок с их токеном"""
+    monkeypatch.setattr(config.api, 'CACHE_ADMIN_TOKEN', 'test-admin-token')
+    return {"Authorization": "Bearer test-admin-token"}
+
 # def pytest_sessionfinish(session, exitstatus):
 #     print("""
 #   _____
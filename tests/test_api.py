@@ -1,57 +1,67 @@
+import csv
+import io
+import json
 from datetime import date, timedelta
 from typing import List
 
 import pytest
 from unittest.mock import AsyncMock, patch
 
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from main import app
+
+from src.configs.config import config
+
 from src.schemas.trading_result_schema import TradingResult
+from src.services.cache_service import data_version, local_cache, build_cache_key, DATA_VERSION_KEY
+from src.services.pagination import NEXT_CURSOR_HEADER
 
 
 # Тесты эндпоинта /last_trading_dates ===============================================================
 @pytest.mark.asyncio
-async def test_get_last_trading_dates(client):
+async def test_get_last_trading_dates(client, mock_redis):
     '''Тест эндпоинта /last_trading_dates без передачи лимита'''
-    with patch('src.services.cache_service.init_redis') as mock_init_redis:
-        mock_redis = AsyncMock()
-        mock_init_redis.return_value = mock_redis
-
-        # Первый вызов - кеш пустой
-        mock_redis.get.return_value = None
+    # Первый вызов - кеш пустой
+    response = await client.get("/last_trading_dates")
 
-        response = await client.get("/last_trading_dates")
+    print(f'\n-----Response: {response.json()}\n')
 
-        print(f'\n-----Response: {response.json()}\n')
-
-        assert response.status_code == 200
-        assert len(response.json()) == 5
+    assert response.status_code == 200
+    assert len(response.json()) == 5
 
-        # Проверяем, что get был вызван
-        mock_redis.get.assert_awaited_once()
-        mock_redis.get.assert_awaited_with("spimex:get_last_trading_dates:{'limit': 5}")
+    # Проверяем, что get был вызван (версия данных + ключ ответа + повторное чтение под блокировкой)
+    assert mock_redis.get.await_count == 3
+    mock_redis.get.assert_awaited_with(build_cache_key("spimex", 0, "get_last_trading_dates", {'limit': 5}))
 
 
 @pytest.mark.parametrize('limit', [1, 10, 14])
 @pytest.mark.asyncio
-async def test_get_last_trading_dates_with_limit(client, limit):
+async def test_get_last_trading_dates_with_limit(client, mock_redis, limit):
     '''Тест эндпоинта /last_trading_dates с лимитом'''
-    with patch('src.services.cache_service.init_redis') as mock_init_redis:
-        mock_redis = AsyncMock()
-        mock_init_redis.return_value = mock_redis
+    # Первый вызов - кеш пустой
+    url = f"/last_trading_dates?limit={limit}"
+    response = await client.get(url)
 
-        # Первый вызов - кеш пустой
-        mock_redis.get.return_value = None
+    print(f"\n----- Limit: {limit}, Response: {response.json()}\n")
 
-        url = f"/last_trading_dates?limit={limit}"
-        response = await client.get(url)
+    assert response.status_code == 200
+    assert len(response.json()) == limit
 
-        print(f"\n----- Limit: {limit}, Response: {response.json()}\n")
+    # Проверяем, что get был вызван с правильным ключом
+    mock_redis.get.assert_awaited_with(build_cache_key("spimex", 0, "get_last_trading_dates", {'limit': limit}))
 
-        assert response.status_code == 200
-        assert len(response.json()) == limit
 
-        # Проверяем, что get был вызван с правильным ключом
-        mock_redis.get.assert_awaited_once()
-        mock_redis.get.assert_awaited_with(f"spimex:get_last_trading_dates:{{'limit': {limit}}}")
+@pytest.mark.asyncio
+async def test_get_trading_days(client, mock_redis):
+    """Справочник торговых дней отдает метаданные дня, согласованные с /last_trading_dates"""
+    dates = (await client.get("/last_trading_dates?limit=3")).json()
+    response = await client.get("/trading_days?limit=3")
+
+    assert response.status_code == 200
+    days = response.json()
+    assert [day['date'] for day in days] == dates
+    assert all(day['rows_count'] > 0 and day['total_volume'] > 0 for day in days)
 
 
 # Тесты эндпоинта get_dynamics ========================================================================
@@ -93,17 +103,12 @@ async def test_get_trading_results_empty_response(client):
     "end_date=2025-01-31",
 ])
 @pytest.mark.asyncio
-async def test_get_dynamics_with_filters(client, query):
+async def test_get_dynamics_with_filters(client, mock_redis, query):
     """Тест с различными комбинациями фильтров"""
-    with patch('src.services.cache_service.init_redis') as mock_init_redis:
-        # Создаем AsyncMock для redis
-        mock_redis = AsyncMock()
-        mock_init_redis.return_value = mock_redis
-        mock_redis.get.return_value = None  # Имитируем пустой кеш
-
-        response = await client.get(f"/dynamics?{query}")
-        assert response.status_code == 200
-        assert type(response.json()) == list
+    # mock_redis имитирует пустой кеш
+    response = await client.get(f"/dynamics?{query}")
+    assert response.status_code == 200
+    assert type(response.json()) == list
 
 # Тесты эндпоинта /trading_results =========================================================
 @pytest.mark.asyncio
@@ -140,3 +145,408 @@ async def test_get_trading_results_with_filters(client, query, expected_count):
     assert isinstance(results, list)
     assert len(results) == expected_count
     assert type(response.json()) == list
+
+
+@pytest.mark.asyncio
+async def test_cache_reuses_app_redis_client(client, mock_redis):
+    """Декоратор берет общий клиент из app.state и не создает новый на каждый запрос"""
+    with patch('src.services.cache_service.init_redis') as mock_init_redis:
+        await client.get("/trading_results?oil_id=A100")
+        await client.get("/trading_results?oil_id=A100&limit=2")
+
+        mock_init_redis.assert_not_called()
+        # Версия данных читается один раз и кешируется в процессе, каждый промах - ключ и повтор под блокировкой
+        assert mock_redis.get.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_local_cache_serves_repeated_requests(client, mock_redis, admin_headers):
+    """Повторный запрос отдается из памяти процесса без обращения к Redis"""
+    first = await client.get("/trading_results?oil_id=A100")
+    second = await client.get("/trading_results?oil_id=A100")
+
+    assert first.json() == second.json()
+    assert mock_redis.get.await_count == 3  # Версия данных + первый промах (ключ и повтор под блокировкой)
+
+    stats = (await client.get("/cache/stats", headers=admin_headers)).json()["local"]
+    assert stats["hits"] == 1
+    assert stats["items"] == 1
+    assert stats["bytes"] > 0
+
+
+@pytest.mark.asyncio
+async def test_data_version_changes_cache_key(client, mock_redis):
+    """После загрузки новых данных (версия выросла) ключ кеша меняется"""
+    await client.get("/last_trading_dates")
+    mock_redis.get.assert_awaited_with(build_cache_key("spimex", 0, "get_last_trading_dates", {'limit': 5}))
+
+    data_version.reset()
+    mock_redis.get.side_effect = lambda key: "3" if key == DATA_VERSION_KEY else None
+    await client.get("/last_trading_dates")
+    mock_redis.get.assert_awaited_with(build_cache_key("spimex", 3, "get_last_trading_dates", {'limit': 5}))
+
+
+@pytest.mark.asyncio
+async def test_redis_hit_matches_fresh_response(client):
+    """Ответ из Redis (готовые байты) совпадает с только что посчитанным"""
+    fresh = await client.get("/dynamics?oil_id=A100&start_date=2024-01-01&end_date=2024-12-31")
+    local_cache.clear()  # Следующий запрос пойдет в Redis, минуя память процесса
+    cached = await client.get("/dynamics?oil_id=A100&start_date=2024-01-01&end_date=2024-12-31")
+
+    assert cached.status_code == 200
+    assert cached.headers["content-type"] == "application/json"
+    assert cached.json() == fresh.json()
+    assert [TradingResult(**item) for item in cached.json()]
+
+
+@pytest.mark.parametrize('first, second', [
+    ("start_date=2024-01-01", f"start_date=2024-01-01&end_date={date.today()}"),
+    ("end_date=2024-12-31", "start_date=2024-01-01&end_date=2024-12-31"),
+    ("oil_id=A100&delivery_type_id=F", "delivery_type_id=F&oil_id=A100"),
+])
+@pytest.mark.asyncio
+async def test_equivalent_dynamics_queries_share_cache_key(client, mock_redis, first, second):
+    """Одинаковые по смыслу запросы /dynamics попадают в один ключ кеша"""
+    await client.get(f"/dynamics?{first}")
+    first_key = mock_redis.get.await_args.args[0]
+    local_cache.clear()
+    await client.get(f"/dynamics?{second}")
+    second_key = mock_redis.get.await_args.args[0]
+
+    assert first_key == second_key
+    assert len(first_key) < 64
+
+
+@pytest.mark.asyncio
+async def test_cache_metrics_per_endpoint(client, admin_headers):
+    """Попадания, промахи и задержки Redis считаются по каждому эндпоинту"""
+    redis = app.state.redis
+    version = await data_version.get(redis)
+    await redis.delete(build_cache_key("spimex", version, "get_trading_results", {'oil_id': 'A100', 'limit': 10}))
+
+    await client.get("/trading_results?oil_id=A100")  # Промах
+    await client.get("/trading_results?oil_id=A100")  # Попадание в память процесса
+    local_cache.clear()
+    await client.get("/trading_results?oil_id=A100")  # Попадание в Redis
+
+    stats = (await client.get("/cache/stats", headers=admin_headers)).json()["endpoints"]["spimex:get_trading_results"]
+    assert stats["misses"] == 1
+    assert stats["hits_local"] == 1
+    assert stats["hits_redis"] == 1
+    assert stats["bytes_written"] > 0
+    assert stats["bytes_read"] == stats["bytes_written"]
+    assert stats["redis_latency"]["get"]["count"] == 3  # Промах читает ключ дважды: до и под блокировкой
+
+    metrics = await client.get("/cache/metrics", headers=admin_headers)
+    assert metrics.status_code == 200
+    assert ('spimex_cache_requests_total{function="get_trading_results",prefix="spimex",result="miss"} 1'
+            in metrics.text)
+
+
+@pytest.mark.parametrize('path', ["/cache/stats", "/cache/metrics"])
+@pytest.mark.asyncio
+async def test_cache_admin_endpoints_require_token(client, monkeypatch, path):
+    """Служебные эндпоинты кеша без настроенного токена отключены, с токеном - только по нему"""
+    monkeypatch.setattr(config.api, 'CACHE_ADMIN_TOKEN', None)
+    assert (await client.get(path)).status_code == 404
+
+    monkeypatch.setattr(config.api, 'CACHE_ADMIN_TOKEN', 'secret')
+    assert (await client.get(path)).status_code == 401
+    assert (await client.get(path, headers={"Authorization": "Bearer wrong"})).status_code == 401
+    assert (await client.get(path, headers={"Authorization": "Bearer secret"})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_do_not_break_requests(client, mock_redis, admin_headers):
+    """Если Redis недоступен, ответ считается из БД, а ошибки попадают в метрики"""
+    mock_redis.get.side_effect = RedisConnectionError("Redis недоступен")
+    mock_redis.set.side_effect = RedisConnectionError("Redis недоступен")
+    mock_redis.zincrby.side_effect = RedisConnectionError("Redis недоступен")
+
+    response = await client.get("/trading_results?oil_id=A100")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+
+    stats = (await client.get("/cache/stats", headers=admin_headers)).json()["endpoints"]["spimex:get_trading_results"]
+    assert stats["errors"] >= 3
+
+
+@pytest.mark.parametrize('endpoint', ["/dynamics", "/trading_results"])
+@pytest.mark.asyncio
+async def test_keyset_pagination_walks_all_rows(client, endpoint):
+    """Страницы по курсору идут по убыванию даты, не пересекаются и покрывают всю выборку"""
+    whole = await client.get(f"{endpoint}?oil_id=A100&limit=1000")
+    assert NEXT_CURSOR_HEADER not in whole.headers
+    full = whole.json()
+    assert len(full) > 3
+
+    pages, cursor = [], None
+    while True:
+        query = f"{endpoint}?oil_id=A100&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        response = await client.get(query)
+        assert response.status_code == 200
+        pages.extend(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    assert pages == full
+    dates = [item['date'] for item in pages]
+    assert dates == sorted(dates, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_next_cursor_is_served_from_cache(client):
+    """Курсор следующей страницы отдается и при попадании в кеш"""
+    first = await client.get("/dynamics?oil_id=A100&limit=2")
+    local_cache.clear()
+    cached = await client.get("/dynamics?oil_id=A100&limit=2")
+
+    assert first.headers[NEXT_CURSOR_HEADER] == cached.headers[NEXT_CURSOR_HEADER]
+
+
+@pytest.mark.parametrize('query', [
+    "/dynamics?oil_id=A100&cursor=not-a-cursor",
+    "/trading_results?oil_id=A100&cursor=bm90LWpzb24",
+])
+@pytest.mark.asyncio
+async def test_invalid_cursor(client, mock_redis, query):
+    response = await client.get(query)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Неверный курсор"
+
+
+@pytest.mark.parametrize('endpoint', ["/dynamics", "/trading_results"])
+@pytest.mark.asyncio
+async def test_page_size_is_capped(client, mock_redis, endpoint):
+    """Размер страницы ограничен MAX_PAGE_SIZE"""
+    response = await client.get(f"{endpoint}?oil_id=A100&limit=1001")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_dynamics_ndjson_stream(client, mock_redis):
+    """Потоковая выгрузка NDJSON отдает все строки фильтра мимо кеша"""
+    full = (await client.get("/dynamics?oil_id=A100&limit=1000")).json()
+    mock_redis.reset_mock()
+
+    response = await client.get("/dynamics?oil_id=A100&limit=2&format=ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == full
+    mock_redis.get.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_dynamics_csv_stream(client, mock_redis):
+    """CSV-выгрузка начинается с заголовка, дальше по строке на запись"""
+    full = (await client.get("/dynamics?oil_id=A100&limit=1000")).json()
+
+    response = await client.get("/dynamics?oil_id=A100&format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="dynamics.csv"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == len(full)
+    assert [row['exchange_product_id'] for row in rows] == [item['exchange_product_id'] for item in full]
+
+
+# Тесты эндпоинта /aggregates ===============================================================
+@pytest.mark.asyncio
+async def test_aggregates_match_raw_rows(client, mock_redis):
+    """Агрегаты по месяцам и oil_id совпадают с суммами по сырым строкам /dynamics"""
+    rows = (await client.get("/dynamics?start_date=2000-01-01&limit=1000")).json()
+    expected = {}
+    for row in rows:
+        key = (row['date'][:7] + '-01', row['oil_id'])
+        volume, total, count = expected.get(key, (0, 0, 0))
+        expected[key] = (volume + row['volume'], total + row['total'], count + row['count'])
+
+    response = await client.get("/aggregates?period=month&group_by=oil_id&start_date=2000-01-01")
+    assert response.status_code == 200
+    aggregates = response.json()
+
+    assert len(aggregates) == len(expected)
+    for item in aggregates:
+        volume, total, count = expected[(item['period_start'], item['oil_id'])]
+        assert item['volume'] == pytest.approx(volume)
+        assert item['total'] == pytest.approx(total)
+        assert item['count'] == count
+        assert item['vwap'] == pytest.approx(total / volume)
+        assert 'delivery_basis_id' not in item
+
+
+@pytest.mark.asyncio
+async def test_aggregates_partial_month_uses_daily_rollups(client, mock_redis):
+    """Диапазон не по границам месяцев считается по дневной витрине и не захватывает лишние дни"""
+    rows = (await client.get("/dynamics?start_date=2024-11-05&end_date=2024-11-14&limit=1000")).json()
+
+    response = await client.get("/aggregates?period=month&start_date=2024-11-05&end_date=2024-11-14")
+    assert response.status_code == 200
+    [item] = response.json()
+
+    assert item['period_start'] == '2024-11-01'
+    assert item['volume'] == pytest.approx(sum(row['volume'] for row in rows))
+    assert item['count'] == sum(row['count'] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_aggregates_week_starts_on_monday(client, mock_redis):
+    response = await client.get("/aggregates?period=week&oil_id=A100")
+    assert response.status_code == 200
+    periods = [item['period_start'] for item in response.json()]
+
+    assert periods
+    assert periods == sorted(set(periods), reverse=True)  # Без измерений - одна строка на неделю
+    assert all(date.fromisoformat(period).weekday() == 0 for period in periods)
+
+
+@pytest.mark.asyncio
+async def test_aggregates_group_by_order_shares_cache_key(client, mock_redis):
+    await client.get("/aggregates?group_by=oil_id&group_by=delivery_type_id")
+    first_key = mock_redis.get.await_args.args[0]
+    local_cache.clear()
+    await client.get("/aggregates?group_by=delivery_type_id&group_by=oil_id")
+
+    assert mock_redis.get.await_args.args[0] == first_key
+
+
+@pytest.mark.parametrize('query', ["period=year", "group_by=volume", "start_date=2024-02-01&end_date=2024-01-01"])
+@pytest.mark.asyncio
+async def test_aggregates_invalid_params(client, mock_redis, query):
+    response = await client.get(f"/aggregates?{query}")
+    assert response.status_code in (400, 422)
+
+
+# Тесты эндпоинта /batch ===============================================================
+@pytest.fixture
+def sequential_batch():
+    """В тестах у всех запросов одна сессия БД, поэтому промахи считаем по одному"""
+    with patch.object(config.api, 'BATCH_CONCURRENCY', 1):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_batch_matches_single_requests(client, sequential_batch):
+    """Результаты пакета совпадают с отдельными запросами, включая курсор следующей страницы"""
+    dynamics = await client.get("/dynamics?oil_id=A100&limit=2")
+    trading = await client.get("/trading_results?delivery_basis_id=UFM")
+    local_cache.clear()
+
+    response = await client.post("/batch", json={"queries": [
+        {"id": "panel-1", "endpoint": "dynamics", "params": {"oil_id": "A100", "limit": 2}},
+        {"id": "panel-2", "endpoint": "trading_results", "params": {"delivery_basis_id": "UFM"}},
+        {"id": "panel-3", "endpoint": "trading_results", "params": {"oil_id": "NOT_EXIST"}},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+
+    assert list(results) == ["panel-1", "panel-2", "panel-3"]
+    assert results["panel-1"]["data"] == dynamics.json()
+    assert results["panel-1"]["headers"][NEXT_CURSOR_HEADER] == dynamics.headers[NEXT_CURSOR_HEADER]
+    assert results["panel-2"]["data"] == trading.json()
+    assert results["panel-3"] == {"status": 200, "headers": {}, "data": []}
+
+
+@pytest.mark.asyncio
+async def test_batch_uses_one_mget_and_shares_cache_keys(client, mock_redis, sequential_batch):
+    """Попадания читаются одним MGET, промахи кладутся в ключи отдельных эндпоинтов"""
+    mock_redis.mget.return_value = [None, None]
+    await client.post("/batch", json={"queries": [
+        {"id": "a", "endpoint": "dynamics", "params": {"oil_id": "A100"}},
+        {"id": "b", "endpoint": "trading_results", "params": {"oil_id": "A100"}},
+    ]})
+    mock_redis.mget.assert_awaited_once()
+    batch_keys = mock_redis.mget.await_args.args[0]
+    written_keys = [call.args[0] for call in mock_redis.set.await_args_list if not call.args[0].startswith("lock:")]
+
+    local_cache.clear()
+    await client.get("/dynamics?oil_id=A100")
+    dynamics_key = mock_redis.get.await_args.args[0]
+    await client.get("/trading_results?oil_id=A100")
+    trading_key = mock_redis.get.await_args.args[0]
+
+    assert batch_keys == [dynamics_key, trading_key]
+    assert written_keys == [dynamics_key, trading_key]
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_errors_per_query(client, mock_redis, sequential_batch):
+    """Ошибка одного запроса не ломает остальные"""
+    mock_redis.mget.return_value = [None, None]
+    response = await client.post("/batch", json={"queries": [
+        {"id": "no-filters", "endpoint": "trading_results", "params": {}},
+        {"id": "bad-limit", "endpoint": "dynamics", "params": {"oil_id": "A100", "limit": 0}},
+        {"id": "ok", "endpoint": "trading_results", "params": {"oil_id": "A100", "limit": 1}},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+
+    assert results["no-filters"]["status"] == 400
+    assert results["bad-limit"]["status"] == 422
+    assert results["ok"]["status"] == 200
+    assert len(results["ok"]["data"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_reports_invalid_date_per_query(client, mock_redis, sequential_batch):
+    """Неверная дата в одной панели - 400 только для нее, соседний запрос выполняется"""
+    mock_redis.mget.return_value = [None]
+    response = await client.post("/batch", json={"queries": [
+        {"id": "bad-date", "endpoint": "dynamics", "params": {"oil_id": "A100", "start_date": "2024-13-01"}},
+        {"id": "ok", "endpoint": "trading_results", "params": {"oil_id": "A100", "limit": 1}},
+    ]})
+    assert response.status_code == 200
+    results = response.json()
+
+    assert results["bad-date"]["status"] == 400
+    assert "detail" in results["bad-date"]
+    assert results["ok"]["status"] == 200
+    assert len(results["ok"]["data"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_records_panel_queries_for_warmup(client, mock_redis, sequential_batch):
+    """В статистику прогрева попадают адреса отдельных запросов панелей, а не /batch"""
+    mock_redis.mget.return_value = [None, None]
+    await client.post("/batch", json={"queries": [
+        {"id": "a", "endpoint": "dynamics", "params": {"oil_id": "A100", "limit": 5}},
+        {"id": "b", "endpoint": "trading_results", "params": {"delivery_basis_id": "UFM"}},
+    ]})
+
+    recorded = sorted(call.args[2] for call in mock_redis.zincrby.await_args_list)
+    assert recorded == ["/dynamics?limit=5&oil_id=A100", "/trading_results?delivery_basis_id=UFM"]
+
+
+@pytest.mark.asyncio
+async def test_batch_counts_panels_per_endpoint(client, mock_redis, sequential_batch, admin_headers):
+    """Попадания и промахи панелей считаются в метриках их эндпоинтов, как у отдельных запросов"""
+    async def endpoint_stats():
+        stats = (await client.get("/cache/stats", headers=admin_headers)).json()["endpoints"]
+        return {name: stats.get(f"spimex:{name}", {}).get("misses", 0)
+                for name in ("get_dynamics", "get_trading_results", "batch")}
+
+    before = await endpoint_stats()
+    mock_redis.mget.return_value = [None, None]
+    await client.post("/batch", json={"queries": [
+        {"id": "a", "endpoint": "dynamics", "params": {"oil_id": "A100"}},
+        {"id": "b", "endpoint": "trading_results", "params": {"oil_id": "A100"}},
+    ]})
+    after = await endpoint_stats()
+
+    assert after["get_dynamics"] - before["get_dynamics"] == 1
+    assert after["get_trading_results"] - before["get_trading_results"] == 1
+    assert after["batch"] == before["batch"]
+
+
+@pytest.mark.parametrize('queries', [
+    [],
+    [{"id": "a", "endpoint": "dynamics"}, {"id": "a", "endpoint": "dynamics"}],
+    [{"id": "a", "endpoint": "last_trading_dates"}],
+])
+@pytest.mark.asyncio
+async def test_batch_invalid_request(client, mock_redis, queries):
+    response = await client.post("/batch", json={"queries": queries})
+    assert response.status_code == 422
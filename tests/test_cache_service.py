@@ -0,0 +1,369 @@
+import asyncio
+import time
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import orjson
+import pytest
+from redis.asyncio import BlockingConnectionPool
+
+from src.configs.config import config
+from src.services.cache_service import (
+    init_redis, LocalCache, cache_response, get_seconds_until_cache_reset, build_cache_key,
+    POPULAR_QUERIES_KEY, WARMUP_HEADER, pack_entry, unpack_entry, CacheService, ENTRY_MARKER, ENTRY_MARKER_COMPRESSED,
+    ENTRY_MARKER_HEADERS_COMPRESSED,
+)
+
+
+def make_request(redis, headers=None):
+    """Минимальный объект запроса с клиентом Redis в app.state"""
+    return SimpleNamespace(
+        app=SimpleNamespace(state=SimpleNamespace(redis=redis)),
+        url=SimpleNamespace(path='/test', query='value=1'),
+        headers=headers or {},
+    )
+
+
+def test_init_redis_uses_bounded_pool():
+    """Клиент Redis строится поверх ограниченного блокирующего пула из конфига"""
+    redis = init_redis()
+    pool = redis.connection_pool
+
+    assert isinstance(pool, BlockingConnectionPool)
+    assert pool.max_connections == config.redis.REDIS_MAX_CONNECTIONS
+    assert pool.timeout == config.redis.REDIS_POOL_TIMEOUT
+    assert pool.connection_kwargs['socket_timeout'] == config.redis.REDIS_SOCKET_TIMEOUT
+
+
+def test_local_cache_lru_eviction_and_ttl():
+    """L1-кеш вытесняет давно использованные ключи и не отдает просроченные"""
+    cache = LocalCache(max_items=2, max_bytes=100)
+    cache.set('a', 1, ttl=60, size=10)
+    cache.set('b', 2, ttl=60, size=10)
+    assert cache.get('a') == 1  # 'a' становится самым свежим
+
+    cache.set('c', 3, ttl=60, size=10)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+    cache.set('d', 4, ttl=60, size=95)  # Не влезает по памяти вместе с остальными
+    assert cache.stats()['bytes'] <= 100
+    assert cache.get('d') == 4
+
+    cache.set('e', 5, ttl=-1, size=1)
+    assert cache.get('e') is None
+
+
+def test_local_cache_stale_grace():
+    """Просроченная запись недоступна через get, но еще отдается через get_stale"""
+    cache = LocalCache(max_items=2, max_bytes=100, stale_grace=60)
+    cache.set('a', 1, ttl=60, size=1)
+    _, value, size = cache._data['a']
+    cache._data['a'] = (time.monotonic() - 1, value, size)  # Запись истекла секунду назад
+
+    assert cache.get('a') is None
+    assert cache.get_stale('a') == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced():
+    """Одновременные промахи по одному ключу запускают одно вычисление"""
+    redis = AsyncMock()
+    redis.get.return_value = None
+    calls = 0
+
+    @cache_response(key_prefix="test", expire=60)
+    async def handler(request, value: int):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    request = make_request(redis)
+    results = await asyncio.gather(*[handler(request, value=21) for _ in range(5)])
+
+    assert [response.body for response in results] == [b'42'] * 5
+    assert calls == 1
+    redis.eval.assert_awaited_once()  # Блокировка снята
+
+
+@pytest.mark.asyncio
+async def test_waits_for_other_worker_result():
+    """Если ключ пересчитывает другой воркер, ждем его результат вместо запроса в БД"""
+    redis = AsyncMock()
+    redis.set.return_value = None  # Блокировку держит другой процесс
+    redis.get.side_effect = [None, None, b'42']  # Версия, промах, результат
+    calls = 0
+
+    @cache_response(key_prefix="test", expire=60)
+    async def handler(request, value: int):
+        nonlocal calls
+        calls += 1
+        return value * 2
+
+    response = await handler(make_request(redis), value=21)
+    assert response.body == b'42'
+    assert calls == 0
+    redis.eval.assert_not_awaited()
+
+
+@pytest.mark.parametrize('now, expected', [
+    (datetime(2025, 5, 20, 10, 0), 4 * 3600 + 11 * 60),  # Сброс сегодня
+    (datetime(2025, 5, 20, 14, 11), 24 * 3600),  # Ровно в момент сброса - следующий завтра
+    (datetime(2025, 5, 20, 20, 0), 18 * 3600 + 11 * 60),  # Сброс завтра
+])
+def test_seconds_until_cache_reset(now, expected):
+    """TTL считается до ближайшего CACHE_RESET_TIME, а не всегда до завтрашнего"""
+    with patch('src.services.cache_service.datetime', wraps=datetime) as mock_datetime, \
+            patch.object(config.redis, 'CACHE_RESET_TIME', '14:11'):
+        mock_datetime.now.return_value = now
+        assert get_seconds_until_cache_reset() == expected
+
+
+@pytest.mark.asyncio
+async def test_ttl_is_computed_at_write_time():
+    """Без явного expire TTL считается в момент записи"""
+    redis = AsyncMock()
+    redis.get.return_value = None
+
+    @cache_response(key_prefix="test")
+    async def handler(request, value: int):
+        return value
+
+    with patch('src.services.cache_service.get_seconds_until_cache_reset', return_value=123):
+        await handler(make_request(redis), value=1)
+
+    key, raw = redis.set.await_args_list[-1].args
+    assert key == build_cache_key("test", 0, "handler", {'value': 1})
+    assert redis.set.await_args_list[-1].kwargs['ex'] == 123 + config.redis.CACHE_STALE_TTL
+
+    entry = unpack_entry(raw)
+    assert entry.body == b'1'
+    assert entry.fresh_until == pytest.approx(time.time() + 123, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_returns_raw_json_body():
+    """Попадание в кеш отдается готовыми байтами без десериализации"""
+    redis = AsyncMock()
+    body = b'[{"oil_id":"A100","volume":60.0}]'
+    redis.get.side_effect = [None, body]  # Версия, готовое тело ответа
+
+    @cache_response(key_prefix="test")
+    async def handler(request, value: int):
+        raise AssertionError("При попадании в кеш обработчик не вызывается")
+
+    response = await handler(make_request(redis), value=1)
+    assert response.body == body
+    assert response.media_type == "application/json"
+
+
+def test_build_cache_key_is_canonical():
+    """Порядок параметров и None не влияют на ключ, разные значения - влияют"""
+    key = build_cache_key("spimex", 1, "get_dynamics", {'oil_id': 'A100', 'start_date': date(2024, 1, 1)})
+
+    assert key == build_cache_key(
+        "spimex", 1, "get_dynamics", {'start_date': date(2024, 1, 1), 'end_date': None, 'oil_id': 'A100'}
+    )
+    assert key != build_cache_key("spimex", 1, "get_dynamics", {'oil_id': 'A101', 'start_date': date(2024, 1, 1)})
+    assert key != build_cache_key("spimex", 2, "get_dynamics", {'oil_id': 'A100', 'start_date': date(2024, 1, 1)})
+    assert key.startswith("spimex:v1:get_dynamics:")
+
+
+@pytest.mark.asyncio
+async def test_miss_records_query_for_warmup():
+    """Посчитанный мимо кеша запрос попадает в статистику для прогрева"""
+    redis = AsyncMock()
+    redis.get.return_value = None
+
+    @cache_response(key_prefix="test")
+    async def handler(request, value: int):
+        return value
+
+    await handler(make_request(redis), value=1)
+    redis.zincrby.assert_awaited_once_with(POPULAR_QUERIES_KEY, 1, '/test?value=1')
+
+
+@pytest.mark.asyncio
+async def test_hits_are_sampled_into_query_stats():
+    """Попадания тоже учитываются - выборочно, с весом 1 / доля выборки"""
+    redis = AsyncMock()
+    now = time.time()
+    redis.get.side_effect = [None, pack_entry(b'1', fresh_until=now + 60, expires_at=now + 60)]
+
+    @cache_response(key_prefix="test-hits", expire=60)
+    async def handler(request, value: int):
+        return value
+
+    with patch.object(config.redis, 'CACHE_HIT_SAMPLE_RATE', 0.5), \
+            patch('src.services.cache_service.random.random', return_value=0.1):
+        await handler(make_request(redis), value=1)
+        await asyncio.sleep(0)  # Запись статистики попадания идет в фоне
+
+    redis.zincrby.assert_awaited_once_with(POPULAR_QUERIES_KEY, 2.0, '/test?value=1')
+
+
+@pytest.mark.asyncio
+async def test_warmup_requests_are_not_recorded():
+    """Запросы прогрева (с заголовком WARMUP_HEADER) не попадают в статистику"""
+    redis = AsyncMock()
+    redis.get.return_value = None
+
+    @cache_response(key_prefix="test-warmup")
+    async def handler(request, value: int):
+        return value
+
+    await handler(make_request(redis, headers={WARMUP_HEADER: '1'}), value=1)
+    redis.zincrby.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_and_refreshed_in_background():
+    """После мягкого TTL отдается старое значение, а новое считается в фоне"""
+    redis = AsyncMock()
+    now = time.time()
+    stale = pack_entry(b'"old"', fresh_until=now - 1, expires_at=now + 60)
+    redis.get.side_effect = [None, stale, stale]  # Версия, устаревшая запись, она же при обновлении
+    refreshed = asyncio.Event()
+
+    @cache_response(key_prefix="test", expire=60, stale_ttl=60)
+    async def handler(request, value: int):
+        refreshed.set()
+        return "new"
+
+    response = await handler(make_request(redis), value=1)
+    assert response.body == b'"old"'
+
+    await asyncio.wait_for(refreshed.wait(), timeout=1)
+    await asyncio.sleep(0.01)  # Даем фоновой задаче записать результат
+    _, raw = redis.set.await_args_list[-1].args
+    assert unpack_entry(raw).body == b'"new"'
+    redis.eval.assert_awaited_once()  # Блокировка на обновление снята
+
+
+@pytest.mark.parametrize('lock_acquired', [True, None])
+@pytest.mark.asyncio
+async def test_revalidate_takes_fresh_value_from_redis(lock_acquired):
+    """
+    Если в Redis уже свежее значение (обновил другой воркер), фоновое обновление
+    не вызывает обработчик, а кладет это значение в L1 - и под своей блокировкой,
+    и когда блокировку держит другой процесс
+    """
+    redis = AsyncMock()
+    redis.set.return_value = lock_acquired
+    now = time.time()
+    redis.get.return_value = pack_entry(b'"fresh"', fresh_until=now + 60, expires_at=now + 120)
+    calls = []
+
+    @cache_response(key_prefix="test-revalidate", expire=60, stale_ttl=60)
+    async def handler(request, value: int):
+        calls.append(value)
+        return "recomputed"
+
+    local = LocalCache(max_items=10, max_bytes=10 ** 6)
+    local.set('key', pack_entry(b'"old"', fresh_until=now - 1, expires_at=now + 60), 60, 10)
+    cache = CacheService(redis, local=local)
+    await handler.cached.revalidate(make_request(redis), cache, 'key', {'value': 1})
+
+    assert calls == []
+    assert unpack_entry(local.get('key')).body == b'"fresh"'
+    assert redis.eval.await_count == (1 if lock_acquired else 0)  # Своя блокировка снята
+
+
+@pytest.mark.asyncio
+async def test_load_takes_value_written_while_waiting_for_lock():
+    """
+    Промах, но пока воркер брал блокировку, предыдущий держатель записал значение и отпустил ее:
+    значение берется из Redis, обработчик не вызывается, блокировка снимается
+    """
+    redis = AsyncMock()
+    redis.set.return_value = True
+    now = time.time()
+    redis.get.return_value = pack_entry(b'"written"', fresh_until=now + 60, expires_at=now + 120)
+    calls = []
+
+    @cache_response(key_prefix="test-load", expire=60)
+    async def handler(request, value: int):
+        calls.append(value)
+        return "recomputed"
+
+    cache = CacheService(redis, local=LocalCache(max_items=10, max_bytes=10 ** 6))
+    entry = await handler.cached.load(make_request(redis), cache, 'key', {'value': 1})
+
+    assert calls == []
+    assert entry.body == b'"written"'
+    assert redis.eval.await_count == 1
+
+
+def test_plain_entry_without_header_is_fresh():
+    """Записи без заголовка (старый формат) читаются как свежие"""
+    entry = unpack_entry(b'[1, 2]')
+    assert entry.body == b'[1, 2]'
+    assert not entry.is_stale
+
+
+@pytest.mark.asyncio
+async def test_large_body_is_compressed_in_redis_only():
+    """Большие тела сжимаются в Redis, а в памяти процесса лежат несжатыми"""
+    redis = AsyncMock()
+    cache = CacheService(redis, local=LocalCache(max_items=10, max_bytes=10 ** 6))
+    body = orjson.dumps([{'oil_id': 'A100', 'volume': 60.0}] * 500)
+
+    with patch.object(config.redis, 'CACHE_COMPRESSION_THRESHOLD', 1024):
+        await cache.set('key', body, expire=60)
+
+    _, stored = redis.set.await_args.args
+    assert stored[:1] == ENTRY_MARKER_COMPRESSED
+    assert len(stored) < len(body) / 5
+    assert unpack_entry(stored).body == body
+    assert unpack_entry(cache.local.get('key')).body == body
+
+    # Чтение из Redis: тело распаковывается, в L1 кладется несжатым
+    cache.local.clear()
+    redis.get.return_value = stored
+    assert (await cache.get('key')).body == body
+    assert cache.local.get('key')[:1] == ENTRY_MARKER
+
+
+@pytest.mark.asyncio
+async def test_small_body_is_stored_plain():
+    """Маленькие тела хранятся без сжатия"""
+    redis = AsyncMock()
+    cache = CacheService(redis, local=LocalCache(max_items=10, max_bytes=10 ** 6))
+
+    with patch.object(config.redis, 'CACHE_COMPRESSION_THRESHOLD', 1024):
+        await cache.set('key', b'[1]', expire=60)
+
+    _, stored = redis.set.await_args.args
+    assert stored[:1] == ENTRY_MARKER
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_entry_keeps_response_headers(compress):
+    """Заголовки ответа хранятся в записи кеша вместе с телом"""
+    headers = {'X-Next-Cursor': 'abc'}
+    raw = pack_entry(b'[1,2]', 10.0, 20.0, compress=compress, headers=headers)
+    entry = unpack_entry(raw)
+
+    assert entry.body == b'[1,2]'
+    assert entry.headers == headers
+    assert (entry.fresh_until, entry.expires_at) == (10.0, 20.0)
+    if compress:
+        assert raw[:1] == ENTRY_MARKER_HEADERS_COMPRESSED
+
+
+@pytest.mark.asyncio
+async def test_get_many_reads_local_then_one_mget():
+    """get_many берет что есть в памяти процесса, остальное - одним MGET"""
+    redis = AsyncMock()
+    cache = CacheService(redis, local=LocalCache(max_items=10, max_bytes=10 ** 6))
+    await cache.set('local', b'[1]', expire=60)
+    redis.mget.return_value = [pack_entry(b'[2]', time.time() + 60, time.time() + 60), None]
+
+    entries = await cache.get_many(['local', 'remote', 'missing'])
+
+    redis.mget.assert_awaited_once_with(['remote', 'missing'])
+    assert [entry.body if entry else None for entry in entries] == [b'[1]', b'[2]', None]
+    assert (cache.metrics.hits_local, cache.metrics.hits_redis, cache.metrics.misses) == (1, 1, 1)
+    assert cache.local.get('remote') is not None
@@ -1,10 +1,19 @@
+import asyncio
 from datetime import date
+
+from asyncpg import PostgresError
 from fastapi import HTTPException
 import pytest
-from sqlalchemy import desc
+from sqlalchemy import desc, make_url, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
 
-from src.databases.database import base_query
-from src.models.trading_results_model import SpimexTradingResults
+from src.databases.database import base_query, fetch_results, get_read_session, RESULT_COLUMNS
+from src.databases.aggregates import rollup_source
+from src.databases.query_plans import representative_queries, plan_problems
+from src.databases.replicas import ReplicaRouter
+from src.models.trading_results_model import SpimexTradingResults, SpimexDailyRollups, SpimexMonthlyRollups
+from src.schemas.trading_result_schema import TradingResult, TRADING_RESULT_FIELDS, trading_result_from_row
 from tests.data import list_models_SpimexTradingResults
 
 
@@ -47,4 +56,182 @@ async def test_base_query_with_oil_id_filter(get_session_fixt, add_objects):
 
     # Проверяем, что все результаты соответствуют фильтру
     assert all(r.oil_id == oil_id for r in results)
-    assert len(results) == 15
\ No newline at end of file
+    assert len(results) == 15
+
+
+@pytest.mark.parametrize('name, expected_indexes', [
+    ('last_trading_dates', ['sqlite_autoindex_spimex_trading_days_1']),
+    ('dynamics_by_dates', ['ix_spimex_trading_results_date_id']),
+    ('dynamics_by_oil_id', ['ix_spimex_trading_results_oil_id_date_id']),
+    ('dynamics_next_page', ['ix_spimex_trading_results_oil_id_date_id']),
+    ('trading_results_by_basis', ['ix_spimex_trading_results_delivery_basis_id_date_id']),
+    ('trading_results_by_type_and_basis', ['ix_spimex_trading_results_delivery_basis_id_date_id',
+                                           'ix_spimex_trading_results_delivery_type_id_date_id']),
+])
+@pytest.mark.asyncio
+async def test_api_queries_use_indexes(get_session_fixt, add_objects, name, expected_indexes):
+    """План запросов API (EXPLAIN QUERY PLAN в SQLite) использует индексы модели"""
+    stmt = representative_queries()[name]
+    sql = stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+
+    rows = await get_session_fixt.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+    plan = ' '.join(str(row[-1]) for row in rows)
+
+    assert any(index in plan for index in expected_indexes), plan
+    assert 'TEMP B-TREE' not in plan  # Сортировка по дате берется из индекса
+
+
+def test_result_indexes_end_with_keyset_order():
+    """
+    Индексы результатов заканчиваются на (date, id) - порядок keyset-пагинации.
+    План SQLite этого не доказывает: там индекс неявно содержит rowid
+    """
+    for index in SpimexTradingResults.__table__.indexes:
+        assert [column.name for column in index.columns][-2:] == ['date', 'id'], index.name
+
+
+def test_plan_problems_flags_scans_and_sorts():
+    nodes = [
+        {'Node Type': 'Limit'},
+        {'Node Type': 'Incremental Sort'},
+        {'Node Type': 'Index Scan', 'Index Name': 'ix_spimex_trading_results_oil_id_date'},
+        {'Node Type': 'Sort'},
+        {'Node Type': 'Seq Scan'},
+    ]
+    assert plan_problems(nodes) == ['Incremental Sort', 'Sort', 'Seq Scan']
+    assert plan_problems([{'Node Type': 'Limit'}, {'Node Type': 'Index Scan'}]) == []
+
+
+@pytest.mark.asyncio
+async def test_fetch_results_matches_orm_path(get_session_fixt, add_objects):
+    """Облегченное чтение по колонкам дает те же ответы, что и ORM + pydantic"""
+    assert tuple(column.key for column in RESULT_COLUMNS[:len(TRADING_RESULT_FIELDS)]) == TRADING_RESULT_FIELDS
+
+    order_by = (desc(SpimexTradingResults.date), desc(SpimexTradingResults.id))
+    entities = await base_query(get_session_fixt, order_by=order_by)
+    rows = await fetch_results(get_session_fixt, order_by=order_by)
+
+    assert [trading_result_from_row(row) for row in rows] == [
+        TradingResult.model_validate(entity).model_dump() for entity in entities
+    ]
+
+
+@pytest.mark.parametrize('period, start_date, end_date, expected', [
+    ('day', None, None, SpimexDailyRollups),
+    ('week', date(2024, 1, 1), None, SpimexDailyRollups),
+    ('month', None, None, SpimexMonthlyRollups),
+    ('month', date(2024, 1, 1), date(2024, 2, 29), SpimexMonthlyRollups),
+    ('month', date(2024, 1, 1), date.today(), SpimexMonthlyRollups),
+    ('month', date(2024, 1, 15), date(2024, 2, 29), SpimexDailyRollups),
+    ('month', date(2024, 1, 1), date(2024, 2, 28), SpimexDailyRollups),
+])
+def test_rollup_source(period, start_date, end_date, expected):
+    """Месячная витрина используется только для диапазонов из целых месяцев"""
+    assert rollup_source(period, start_date, end_date) is expected
+
+
+def make_engine(path: str = ":memory:"):
+    return create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+
+@pytest.mark.asyncio
+async def test_replica_router_round_robin_and_fallback():
+    """Чтение идет по репликам по кругу, без реплик - в основную БД"""
+    primary, first, second = make_engine(), make_engine(), make_engine()
+
+    assert ReplicaRouter(primary).pick() is primary
+
+    router = ReplicaRouter(primary, [first, second])
+    assert [router.pick() for _ in range(4)] == [first, second, first, second]
+
+    router.mark_down(first)
+    assert {router.pick() for _ in range(3)} == {second}
+    router.mark_down(second)
+    assert router.pick() is primary
+
+
+@pytest.mark.asyncio
+async def test_replica_router_check_excludes_broken_replica():
+    """Недоступная реплика исключается проверкой и возвращается, когда снова отвечает"""
+    primary, alive = make_engine(), make_engine()
+    broken = make_engine("/nonexistent/dir/replica.db")
+    router = ReplicaRouter(primary, [alive, broken], check_timeout=1.0)
+
+    await router.check()
+    assert router.healthy == [alive]
+    assert {router.pick() for _ in range(3)} == {alive}
+
+    router.mark_down(alive)
+    await router.check()
+    assert router.healthy == [alive]
+
+
+@pytest.mark.asyncio
+async def test_replica_check_survives_unexpected_errors(monkeypatch):
+    """Неожиданная ошибка драйвера исключает реплику, а упавшая проверка не останавливает фоновую задачу"""
+    class OddEngine:
+        url = make_url("postgresql+asyncpg://replica/db")
+
+        def connect(self):
+            raise ValueError("unexpected driver error")
+
+    primary, alive, odd = make_engine(), make_engine(), OddEngine()
+    router = ReplicaRouter(primary, [alive, odd], check_timeout=1.0)
+    await router.check()
+    assert router.healthy == [alive]
+
+    calls = []
+
+    async def check():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("check failed")
+
+    monkeypatch.setattr(router, 'check', check)
+    task = asyncio.create_task(router.run_checks(0))
+    while len(calls) < 2:
+        await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_read_session_marks_replica_down_on_asyncpg_error(monkeypatch):
+    """Ошибка asyncpg при подключении, не обернутая SQLAlchemy, тоже исключает реплику"""
+    primary, replica = make_engine(), make_engine()
+    router = ReplicaRouter(primary, [replica])
+    monkeypatch.setattr('src.databases.database.read_router', router)
+
+    dependency = get_read_session()
+    session = await anext(dependency)
+    await session.execute(text("SELECT 1"))
+    with pytest.raises(PostgresError):
+        await dependency.athrow(PostgresError("the database system is starting up"))
+    assert router.healthy == []
+
+
+@pytest.mark.asyncio
+async def test_read_session_is_opened_only_on_first_query(monkeypatch):
+    """Сессия чтения (и выбор реплики) создается только при первом запросе к БД"""
+    primary = make_engine()
+    router = ReplicaRouter(primary)
+    monkeypatch.setattr('src.databases.database.read_router', router)
+    opened = []
+    original_session = router.session
+    monkeypatch.setattr(router, 'session', lambda bind: opened.append(bind) or original_session(bind))
+
+    # Попадание в кеш: обработчик не обращается к сессии
+    dependency = get_read_session()
+    session = await anext(dependency)
+    await dependency.aclose()
+    assert not session.started
+    assert opened == []
+
+    # Промах: сессия открывается при первом запросе
+    dependency = get_read_session()
+    session = await anext(dependency)
+    assert (await session.execute(text("SELECT 1"))).scalar() == 1
+    await dependency.aclose()
+    assert session.started
+    assert opened == [primary]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from http_client import create_http_session
+
+
+@pytest_asyncio.fixture
+async def stub_server():
+    """Локальная заглушка spimex.com: отдает файл и запоминает клиентские соединения"""
+    connections = []
+
+    async def bulletin(request):
+        connections.append(request.transport.get_extra_info('peername'))
+        await asyncio.sleep(0.01)
+        return web.Response(body=b'xls')
+
+    app = web.Application()
+    app.router.add_get('/upload/reports/oil_xls/{name}', bulletin)
+    server = TestServer(app)
+    await server.start_server()
+    yield server, connections
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_downloads_reuse_connection(stub_server):
+    """Последовательные загрузки идут по одному keep-alive соединению"""
+    server, connections = stub_server
+    async with create_http_session() as session:
+        for i in range(5):
+            async with session.get(server.make_url(f'/upload/reports/oil_xls/{i}.xls')) as response:
+                assert await response.read() == b'xls'
+
+    assert len(connections) == 5
+    assert len(set(connections)) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_downloads_respect_per_host_limit(stub_server):
+    """Параллельные загрузки открывают не больше limit_per_host соединений и переиспользуют их"""
+    server, connections = stub_server
+
+    async def download(session, i):
+        async with session.get(server.make_url(f'/upload/reports/oil_xls/{i}.xls')) as response:
+            return await response.read()
+
+    async with create_http_session(limit_per_host=2) as session:
+        results = await asyncio.gather(*(download(session, i) for i in range(10)))
+
+    assert results == [b'xls'] * 10
+    assert len(set(connections)) == 2
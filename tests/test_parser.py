@@ -0,0 +1,384 @@
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("pandas")
+
+from sqlalchemy.dialects import postgresql
+
+import parser as bulletin_parser
+import pipeline
+import save_to_database
+
+
+# Бюллетень в формате spimex: две строки со сделками и одна без сделок между маркерами таблицы
+BULLETIN_SAMPLE = Path(__file__).with_name('bulletin_sample.xls')
+
+
+def bulletin(day: int) -> dict:
+    return {'date': date(2024, 1, day), 'url': f'https://spimex.test/{day}.xls'}
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    """Список бюллетеней из трех страниц (от новых к старым) вместо сайта; запоминает обойденные страницы"""
+    pages = {1: [bulletin(9), bulletin(8), bulletin(7)], 2: [bulletin(6), bulletin(5), bulletin(4)],
+             3: [bulletin(3), bulletin(2), bulletin(1)]}
+    visited = []
+
+    async def parse_bulletin_page(session, page_num):
+        visited.append(page_num)
+        return list(pages[page_num]), page_num == len(pages)
+
+    monkeypatch.setattr(bulletin_parser, 'parse_bulletin_page', parse_bulletin_page)
+    return visited
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """Этапы конвейера без сети и БД: файл - URL в байтах, разбор - одна запись, запись - в список"""
+    saved = []
+
+    async def download_file(session, url):
+        return url.encode()
+
+    def parse_bulletin(file_content, trade_date):
+        return [(file_content.decode(), trade_date)]
+
+    async def save_bulletin(session, item, records):
+        saved.append(item['date'])
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    monkeypatch.setattr(pipeline, 'parse_bulletin', parse_bulletin)
+    monkeypatch.setattr(pipeline, 'save_bulletin', save_bulletin)
+    monkeypatch.setattr(pipeline, 'AsyncSessionLocal', nullcontext)
+    # Потоки вместо процессов: подмененные функции не нужно передавать в другой процесс
+    monkeypatch.setattr(pipeline, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    return saved
+
+
+def file_hash(item: dict) -> str:
+    return hashlib.sha256(item['url'].encode()).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_full_listing_walks_all_pages(listing):
+    links = await bulletin_parser.get_all_bulletin_links(None)
+    assert [link['date'].day for link in links] == [9, 8, 7, 6, 5, 4, 3, 2, 1]
+    assert listing == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_incremental_listing_retries_missing_dates(listing):
+    """
+    Берутся даты, которых нет в журнале (в том числе пропущенная в прошлый раз 6-я),
+    и последняя загруженная; обход останавливается на странице, целиком бывшей в журнале
+    """
+    known = {date(2024, 1, day) for day in (8, 5, 4, 3, 2, 1)}
+    links = await bulletin_parser.get_all_bulletin_links(None, known)
+
+    assert [link['date'].day for link in links] == [9, 8, 7, 6]
+    assert listing == [1, 2, 3]  # На 2-й странице есть незагруженная 6-я, поэтому идем дальше
+
+
+@pytest.mark.asyncio
+async def test_incremental_listing_retries_pending_below_known_page(listing):
+    """
+    5-я упала в прошлом запуске и осталась в очереди незагруженных, а 1-я страница
+    целиком в журнале: обход идет дальше до страницы с 5-й
+    """
+    known = {date(2024, 1, day) for day in range(1, 10) if day != 5}
+    links = await bulletin_parser.get_all_bulletin_links(None, known, {date(2024, 1, 5)})
+
+    assert [link['date'].day for link in links] == [9, 5]
+    assert listing == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_incremental_listing_stops_on_first_known_page(listing):
+    known = {date(2024, 1, day) for day in range(1, 10)}
+    links = await bulletin_parser.get_all_bulletin_links(None, known)
+
+    assert [link['date'].day for link in links] == [9]  # Последняя дата - проверить, не перевыложен ли файл
+    assert listing == [1]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_skips_unchanged_files(fake_stages):
+    """Файл с тем же хешем, что в журнале, не разбирается и не пишется; измененный - пишется"""
+    unchanged, changed, new = bulletin(3), bulletin(2), bulletin(1)
+    known_hashes = {unchanged['date']: file_hash(unchanged), changed['date']: 'old-hash'}
+
+    stages = await pipeline.run_pipeline(None, [unchanged, changed, new], known_hashes)
+
+    assert sorted(fake_stages) == [new['date'], changed['date']]
+    assert stages[0].skipped == 1
+    assert changed['content_hash'] == file_hash(changed)  # Новый хеш уйдет в журнал
+
+
+@pytest.mark.asyncio
+async def test_parse_bulletin_in_process_pool():
+    """Разбор идет в отдельном процессе, как в конвейере: записи - кортежи в порядке RESULT_FIELDS"""
+    pytest.importorskip("xlrd")
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(1) as pool:
+        records = await loop.run_in_executor(
+            pool, save_to_database.parse_bulletin, BULLETIN_SAMPLE.read_bytes(), date(2024, 1, 9)
+        )
+        empty = await loop.run_in_executor(pool, save_to_database.parse_bulletin, b'not an xls', date(2024, 1, 9))
+
+    assert empty == []
+    assert [len(record) for record in records] == [len(save_to_database.RESULT_FIELDS)] * 2  # Строка без сделок отброшена
+    fields = dict(zip(save_to_database.RESULT_FIELDS, records[1]))
+    assert fields == {
+        'exchange_product_id': 'A592ANK005A',
+        'exchange_product_name': 'Бензин (АИ-92-К5), Ангарск-группа станций (ст. отправления)',
+        'oil_id': 'A592',
+        'delivery_basis_id': 'ANK',
+        'delivery_basis_name': 'ст. Ангарск-группа станций',
+        'delivery_type_id': 'A',
+        'volume': 120.0,
+        'total': 6600000.0,
+        'count': 3,
+        'date': date(2024, 1, 9),
+    }
+    assert records[0][0] == 'A100ANK060F'
+
+
+class Concurrency:
+    """Сколько вызовов идет одновременно сейчас и максимум за тест"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()  # Разбор идет в потоках пула
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_writes_every_bulletin_once(fake_stages):
+    bulletins = [bulletin(day) for day in range(1, 21)]
+    stages = await pipeline.run_pipeline(None, bulletins)
+
+    assert sorted(fake_stages) == [item['date'] for item in bulletins]
+    assert [stage.done for stage in stages] == [20, 20, 20]
+    assert [stage.inbox.qsize() for stage in stages] == [0, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_counts_failures_and_continues(fake_stages, monkeypatch):
+    """Ошибка скачивания или записи одного бюллетеня учитывается и не останавливает остальные"""
+    async def download_file(session, url):
+        if url.endswith('/2.xls'):
+            raise ConnectionError("404")
+        return url.encode()
+
+    async def save_bulletin(session, item, records):
+        if item['date'].day == 3:
+            raise RuntimeError("deadlock")
+        fake_stages.append(item['date'])
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    monkeypatch.setattr(pipeline, 'save_bulletin', save_bulletin)
+
+    stages = await pipeline.run_pipeline(None, [bulletin(day) for day in range(1, 6)])
+
+    assert sorted(item.day for item in fake_stages) == [1, 4, 5]
+    assert (stages[0].done, stages[0].failed) == (4, 1)
+    assert (stages[2].done, stages[2].failed) == (3, 1)
+    # Упавшие остаются в очереди незагруженных до следующего запуска
+    assert sorted(item['date'].day for stage in stages for item in stage.failed_bulletins) == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_stage_concurrency_within_workers(fake_stages, monkeypatch):
+    downloads, parses, writes = Concurrency(), Concurrency(), Concurrency()
+
+    async def download_file(session, url):
+        with downloads:
+            await asyncio.sleep(0.005)
+        return url.encode()
+
+    def parse_bulletin(file_content, trade_date):
+        with parses:
+            time.sleep(0.005)
+        return [(file_content.decode(), trade_date)]
+
+    async def save_bulletin(session, item, records):
+        with writes:
+            await asyncio.sleep(0.01)
+        fake_stages.append(item['date'])
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    monkeypatch.setattr(pipeline, 'parse_bulletin', parse_bulletin)
+    monkeypatch.setattr(pipeline, 'save_bulletin', save_bulletin)
+    monkeypatch.setattr(pipeline, 'DOWNLOAD_WORKERS', 3)
+    monkeypatch.setattr(pipeline, 'PARSE_WORKERS', 2)
+    monkeypatch.setattr(pipeline, 'WRITE_WORKERS', 2)
+
+    await pipeline.run_pipeline(None, [bulletin(day) for day in range(1, 21)])
+
+    assert len(fake_stages) == 20
+    assert downloads.peak == 3
+    assert 1 <= parses.peak <= 2
+    assert writes.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_full_queue_blocks_upstream_stages(fake_stages, monkeypatch):
+    """Пока запись стоит, скачивание останавливается, заполнив очереди, а не качает все подряд"""
+    downloaded = []
+    write_released = asyncio.Event()
+
+    async def download_file(session, url):
+        downloaded.append(url)
+        return url.encode()
+
+    async def save_bulletin(session, item, records):
+        await write_released.wait()
+        fake_stages.append(item['date'])
+
+    monkeypatch.setattr(pipeline, 'download_file', download_file)
+    monkeypatch.setattr(pipeline, 'save_bulletin', save_bulletin)
+    for name in ('DOWNLOAD_WORKERS', 'PARSE_WORKERS', 'WRITE_WORKERS', 'PIPELINE_QUEUE_SIZE'):
+        monkeypatch.setattr(pipeline, name, 1)
+
+    run = asyncio.create_task(pipeline.run_pipeline(None, [bulletin(day) for day in range(1, 21)]))
+    await asyncio.sleep(0.1)
+    # В работе записи, в очереди записи, у воркера разбора, в очереди разбора и у воркера скачивания
+    assert len(downloaded) <= 5
+    assert fake_stages == []
+
+    write_released.set()
+    stages = await asyncio.wait_for(run, timeout=5)
+    assert len(downloaded) == 20
+    assert stages[-1].done == 20
+
+
+def result_record(product_id: str, volume: float) -> tuple:
+    return (product_id, "Бензин", product_id[:4], product_id[4:7], "Ангарск", product_id[-1],
+            volume, volume * 1000, 1, date(2024, 1, 9))
+
+
+class RecordingResult:
+    def one(self):
+        return 3, 150
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+        self.merged = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return RecordingResult()
+
+    async def merge(self, instance):
+        self.merged.append(instance)
+
+
+def literal_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.asyncio
+async def test_upsert_rows_batches_and_dedups(monkeypatch):
+    """Пачки по UPSERT_BATCH_SIZE, повтор продукта схлопывается в последнюю строку, created_on не обновляется"""
+    monkeypatch.setattr(save_to_database, 'UPSERT_BATCH_SIZE', 2)
+    session = RecordingSession()
+    records = [result_record('A100ANK060F', 1), result_record('A592ANK005A', 2),
+               result_record('A100ANK060F', 3), result_record('DT12ANK005A', 4)]
+
+    await save_to_database.upsert_rows(session, records)
+
+    compiled = [statement.compile(dialect=postgresql.dialect()) for statement in session.statements]
+    assert len(compiled) == 2
+    sql = str(compiled[0])
+    assert sql.startswith("INSERT INTO spimex_trading_results")
+    assert "ON CONFLICT ON CONSTRAINT uq_spimex_trading_results_product_date DO UPDATE SET" in sql
+    update_clause = sql.split("DO UPDATE SET", 1)[1]
+    assert "volume = excluded.volume" in update_clause
+    assert "updated_on = excluded.updated_on" in update_clause
+    assert "created_on" not in update_clause
+
+    rows = [(key, value) for statement in compiled for key, value in statement.params.items()
+            if key.startswith(('exchange_product_id_', 'volume_'))]
+    products = [value for key, value in rows if key.startswith('exchange_product_id_')]
+    volumes = [value for key, value in rows if key.startswith('volume_')]
+    assert products == ['A100ANK060F', 'A592ANK005A', 'DT12ANK005A']
+    assert volumes == [3, 2, 4]  # Для повторного продукта - последняя строка
+
+
+@pytest.mark.asyncio
+async def test_pending_bulletins_marked_and_cleared():
+    """Повторно найденный бюллетень обновляет адрес в очереди; из очереди убираются только переданные даты"""
+    session = RecordingSession()
+    await save_to_database.mark_pending(session, [bulletin(2), bulletin(1)])
+    await save_to_database.clear_pending(session, [date(2024, 1, 2)])
+    await save_to_database.clear_pending(session, [])
+
+    assert len(session.statements) == 2
+    marked, cleared = [statement.compile(dialect=postgresql.dialect()) for statement in session.statements]
+    assert str(marked).startswith("INSERT INTO spimex_pending_bulletins")
+    assert "ON CONFLICT (date) DO UPDATE SET url = excluded.url" in str(marked)
+    assert sorted(value for key, value in marked.params.items() if key.startswith('date_')) == \
+        [date(2024, 1, 1), date(2024, 1, 2)]
+    assert str(cleared).startswith("DELETE FROM spimex_pending_bulletins WHERE spimex_pending_bulletins.date IN")
+    assert list(cleared.params.values()) == [[date(2024, 1, 2)]]
+
+
+@pytest.mark.asyncio
+async def test_refresh_rollups_rewrites_only_bulletin_day_and_month():
+    """
+    Дневная витрина пересчитывается только за дату бюллетеня, месячная - из дневной за [начало месяца,
+    начало следующего), и только после advisory-блокировки месяца
+    """
+    session = RecordingSession()
+    await save_to_database.refresh_rollups(session, '2024-02-15')
+
+    sql = [literal_sql(statement) for statement in session.statements]
+    assert len(sql) == 5
+    delete_daily, insert_daily, lock, delete_monthly, insert_monthly = sql
+
+    assert delete_daily == "DELETE FROM spimex_daily_rollups WHERE spimex_daily_rollups.date = '2024-02-15'"
+    assert insert_daily.startswith("INSERT INTO spimex_daily_rollups")
+    assert "FROM spimex_trading_results" in insert_daily
+    assert "WHERE spimex_trading_results.date = '2024-02-15'" in insert_daily
+
+    assert lock == "SELECT pg_advisory_xact_lock(202402) AS pg_advisory_xact_lock_1"
+    assert delete_monthly == "DELETE FROM spimex_monthly_rollups WHERE spimex_monthly_rollups.date = '2024-02-01'"
+    assert insert_monthly.startswith("INSERT INTO spimex_monthly_rollups")
+    assert "FROM spimex_daily_rollups" in insert_monthly
+    assert ("WHERE spimex_daily_rollups.date >= '2024-02-01' AND spimex_daily_rollups.date < '2024-03-01'"
+            in insert_monthly)
+
+
+@pytest.mark.asyncio
+async def test_update_trading_day_recounts_bulletin_day():
+    """Строка справочника считается по результатам за дату бюллетеня и запоминает файл"""
+    session = RecordingSession()
+    await save_to_database.update_trading_day(session, '2024-12-31', 'https://spimex.test/31.xls', 'abc')
+
+    sql = literal_sql(session.statements[0])
+    assert "FROM spimex_trading_results" in sql
+    assert sql.endswith("WHERE spimex_trading_results.date = '2024-12-31'")
+    day = session.merged[0]
+    assert (day.date, day.rows_count, day.total_volume) == (date(2024, 12, 31), 3, 150)
+    assert (day.source_url, day.content_hash) == ('https://spimex.test/31.xls', 'abc')